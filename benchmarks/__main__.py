@@ -0,0 +1,243 @@
+# Copyright 2012 Brian Waldon
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measure the throughput and memory use of warlock's hot paths
+
+    python -m benchmarks                      # run everything
+    python -m benchmarks -k small --quick     # a quick subset
+    python -m benchmarks --save base.json     # record a baseline
+    python -m benchmarks --compare base.json  # report changes against it
+    python -m benchmarks -k startup           # import and first model time
+
+With --compare, the exit status is 1 if any benchmark got slower, or
+allocated more, by more than --threshold.
+"""
+
+import argparse
+import copy
+import fnmatch
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+
+import warlock
+
+from . import schemas, startup
+
+
+def _instance(scenario, **options):
+    Model = warlock.model_factory(scenario.schema, **options)
+    return Model(copy.deepcopy(scenario.document))
+
+
+def factory(scenario):
+    return lambda: warlock.model_factory(scenario.schema)
+
+
+def init(scenario):
+    Model = warlock.model_factory(scenario.schema)
+    return lambda: Model(scenario.document)
+
+
+def init_compiled(scenario):
+    Model = warlock.model_factory(scenario.schema, compiled=True)
+    return lambda: Model(scenario.document)
+
+
+def init_trusted(scenario):
+    Model = warlock.model_factory(scenario.schema)
+    return lambda: Model.trusted(scenario.document)
+
+
+def validate(scenario):
+    instance = _instance(scenario)
+    return lambda: instance.validate(scenario.document)
+
+
+def validate_compiled(scenario):
+    instance = _instance(scenario, compiled=True)
+    return lambda: instance.validate(scenario.document)
+
+
+def setitem(scenario):
+    instance = _instance(scenario)
+    return lambda: [instance.__setitem__(k, v) for k, v in scenario.writes]
+
+
+def getitem(scenario):
+    instance = _instance(scenario)
+    keys = list(scenario.document)
+    return lambda: [instance[key] for key in keys]
+
+
+def items(scenario):
+    instance = _instance(scenario)
+    return lambda: [value for _, value in instance.items()]
+
+
+def patch(scenario):
+    instance = _instance(scenario)
+    for key, value in scenario.writes:
+        instance[key] = value
+    return lambda: instance.patch
+
+
+def to_bytes(scenario):
+    instance = _instance(scenario)
+    return instance.to_bytes
+
+
+def from_json(scenario):
+    Model = warlock.model_factory(scenario.schema)
+    data = json.dumps(scenario.document)
+    return lambda: Model.from_json(data)
+
+
+def deepcopy(scenario):
+    instance = _instance(scenario)
+    return lambda: copy.deepcopy(instance)
+
+
+def fork(scenario):
+    instance = _instance(scenario)
+    return instance.fork
+
+
+# Each benchmark takes a scenario and returns the callable to time
+BENCHMARKS = [
+    factory,
+    init,
+    init_compiled,
+    init_trusted,
+    validate,
+    validate_compiled,
+    setitem,
+    getitem,
+    items,
+    patch,
+    to_bytes,
+    from_json,
+    deepcopy,
+    fork,
+]
+
+
+def measure(func, repeat, min_time):
+    """Return the best operations per second of func, and the bytes it
+    allocates at its peak"""
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1] - before
+        del result
+    finally:
+        tracemalloc.stop()
+    return {"ops": 1 / best, "peak_bytes": peak}
+
+
+def compare(results, baseline, threshold):
+    """Print each result beside its baseline, returning the regressions"""
+    regressions = []
+    print("%-28s %14s %14s %9s %9s" % ("benchmark", "ops/s", "base", "speed", "memory"))
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print("%-28s %14.1f %14s" % (name, result["ops"], "-"))
+            continue
+        speed = result["ops"] / base["ops"]
+        memory = (result["peak_bytes"] + 1) / (base["peak_bytes"] + 1)
+        flag = ""
+        if speed < 1 - threshold or memory > 1 + threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            "%-28s %14.1f %14.1f %8.2fx %8.2fx%s"
+            % (name, result["ops"], base["ops"], speed, memory, flag)
+        )
+    return regressions
+
+
+def _selected(name, pattern):
+    return not pattern or fnmatch.fnmatch(name, "*%s*" % pattern)
+
+
+def _report(name, result, comparing):
+    # Results are printed beside their baseline instead when comparing
+    if not comparing:
+        print(
+            "%-28s %14.1f ops/s %10.1f us/op %12d bytes/op"
+            % (name, result["ops"], 1e6 / result["ops"], result["peak_bytes"])
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("-k", "--filter", help="only run benchmarks matching *K*")
+    parser.add_argument("--quick", action="store_true", help="fewer, shorter runs")
+    parser.add_argument("--large-size", type=int, default=10000, metavar="N")
+    parser.add_argument("--save", metavar="FILE", help="write results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="compare with a baseline")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    repeat, min_time = (1, 0.05) if args.quick else (5, 0.2)
+    results = {}
+    for scenario in schemas.scenarios(args.large_size):
+        for benchmark in BENCHMARKS:
+            name = "%s.%s" % (scenario.name, benchmark.__name__)
+            if _selected(name, args.filter):
+                results[name] = measure(benchmark(scenario), repeat, min_time)
+                _report(name, results[name], args.compare)
+    if any(_selected(name, args.filter) for name in startup.NAMES):
+        for name, result in startup.measure(3 if args.quick else 10).items():
+            if _selected(name, args.filter):
+                results[name] = result
+                _report(name, result, args.compare)
+
+    if args.save:
+        with open(args.save, "w") as fp:
+            json.dump(
+                {
+                    "warlock": warlock.__version__,
+                    "python": platform.python_version(),
+                    "results": results,
+                },
+                fp,
+                indent=2,
+                sort_keys=True,
+            )
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)["results"]
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
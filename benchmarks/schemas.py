@@ -0,0 +1,165 @@
+# Copyright 2012 Brian Waldon
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Schemas and documents exercised by the benchmarks
+
+Each scenario is built from code rather than loaded from disk, so the
+benchmarks run offline and their sizes can be changed in one place.
+"""
+
+import collections
+
+Scenario = collections.namedtuple("Scenario", "name schema document writes")
+
+
+def small():
+    """A flat schema of a few scalar properties"""
+    schema = {
+        "name": "Country",
+        "type": "object",
+        "properties": {
+            "name": {"type": "string", "maxLength": 64},
+            "code": {"type": "string", "pattern": "^[A-Z]{2}$"},
+            "population": {"type": "integer", "minimum": 0},
+            "area": {"type": "number", "minimum": 0},
+            "eu": {"type": "boolean"},
+            "continent": {"enum": ["Africa", "Americas", "Asia", "Europe"]},
+        },
+        "required": ["name", "code"],
+        "additionalProperties": {"type": "string"},
+    }
+    document = {
+        "name": "Sweden",
+        "code": "SE",
+        "population": 10500000,
+        "area": 450295.0,
+        "eu": True,
+        "continent": "Europe",
+    }
+    for i in range(4):
+        document["note%d" % i] = "note %d" % i
+    writes = [("population", 10600000), ("eu", False), ("note0", "edited")]
+    return Scenario("small", schema, document, writes)
+
+
+def medium():
+    """A nested schema using local references and defaults"""
+    schema = {
+        "name": "Person",
+        "type": "object",
+        "definitions": {
+            "address": {
+                "type": "object",
+                "properties": {
+                    "street": {"type": "string"},
+                    "city": {"type": "string"},
+                    "country": {"type": "string", "default": "SE"},
+                    "geo": {
+                        "type": "object",
+                        "properties": {
+                            "lat": {"type": "number"},
+                            "lon": {"type": "number"},
+                            "datum": {"type": "string", "default": "WGS84"},
+                        },
+                    },
+                },
+                "required": ["city"],
+            },
+            "contact": {
+                "type": "object",
+                "properties": {
+                    "kind": {"enum": ["email", "phone"]},
+                    "value": {"type": "string", "minLength": 3},
+                },
+                "required": ["kind", "value"],
+            },
+        },
+        "properties": {
+            "name": {"type": "string"},
+            "age": {"type": "integer", "minimum": 0},
+            "active": {"type": "boolean", "default": True},
+            "home": {"$ref": "#/definitions/address"},
+            "work": {"$ref": "#/definitions/address"},
+            "contacts": {"type": "array", "items": {"$ref": "#/definitions/contact"}},
+            "tags": {"type": "array", "items": {"type": "string"}, "maxItems": 100},
+        },
+        "required": ["name"],
+    }
+    document = {
+        "name": "Ada",
+        "age": 36,
+        "home": {"street": "1 Main St", "city": "London", "geo": {"lat": 51.5}},
+        "work": {"city": "Cambridge"},
+        "contacts": [
+            {"kind": "email" if i % 2 else "phone", "value": "contact-%d" % i}
+            for i in range(40)
+        ],
+        "tags": ["tag%d" % i for i in range(50)],
+    }
+    writes = [
+        ("age", 37),
+        ("work", {"city": "Oxford", "country": "UK"}),
+        ("tags", ["tag%d" % i for i in range(49)]),
+    ]
+    return Scenario("medium", schema, document, writes)
+
+
+def large(size=10000):
+    """A generated schema of size properties, each a reference to one of a
+    handful of shared definitions, some carrying defaults"""
+    definitions = {
+        "label": {"type": "string", "maxLength": 128},
+        "count": {"type": "integer", "minimum": 0},
+        "ratio": {"type": "number", "minimum": 0, "maximum": 1},
+        "flag": {"type": "boolean", "default": False},
+        "point": {
+            "type": "object",
+            "properties": {
+                "x": {"type": "number"},
+                "y": {"type": "number"},
+                "unit": {"type": "string", "default": "px"},
+            },
+        },
+    }
+    kinds = sorted(definitions)
+    values = {
+        "label": "value",
+        "count": 7,
+        "ratio": 0.5,
+        "flag": True,
+        "point": {"x": 1.0, "y": 2.0},
+    }
+
+    properties = {}
+    document = {}
+    for i in range(size):
+        kind = kinds[i % len(kinds)]
+        key = "%s%d" % (kind, i)
+        properties[key] = {"$ref": "#/definitions/%s" % kind}
+        # Leave every tenth flag out so its default gets filled in
+        if not (kind == "flag" and i % 50 == 1):
+            document[key] = values[kind]
+
+    schema = {
+        "name": "Record",
+        "type": "object",
+        "definitions": definitions,
+        "properties": properties,
+    }
+    writes = [("count0", 8), ("label2", "edited"), ("point3", {"x": 0, "y": 0})]
+    return Scenario("large", schema, document, writes)
+
+
+def scenarios(large_size=10000):
+    return [small(), medium(), large(large_size)]
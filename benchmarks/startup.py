@@ -0,0 +1,82 @@
+# Copyright 2012 Brian Waldon
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Time `import warlock` and building the first model, as a CLI tool or a
+cold-started function would
+
+Every sample runs in a fresh interpreter, so nothing is already imported.
+`python -X importtime -c "import warlock"` shows where the time goes.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import warlock
+
+from . import schemas
+
+NAMES = ("startup.import", "startup.first_model")
+
+_SCRIPT = """
+import json, sys, time, tracemalloc
+
+scenario = json.loads(sys.stdin.read())
+trace = sys.argv[1] == "trace"
+if trace:
+    tracemalloc.start()
+start = time.perf_counter()
+import warlock
+imported = time.perf_counter()
+if trace:
+    peaks = [tracemalloc.get_traced_memory()[1]]
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+warlock.model_factory(scenario["schema"])(scenario["document"])
+built = time.perf_counter()
+if trace:
+    peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    print(json.dumps(peaks))
+else:
+    print(json.dumps([imported - start, built - imported]))
+"""
+
+
+def _run(mode, scenario):
+    # Run from the directory holding the warlock being benchmarked, so the
+    # child imports the same copy
+    root = os.path.dirname(os.path.dirname(os.path.abspath(warlock.__file__)))
+    output = subprocess.run(
+        [sys.executable, "-c", _SCRIPT, mode],
+        input=json.dumps({"schema": scenario.schema, "document": scenario.document}),
+        capture_output=True,
+        check=True,
+        cwd=root,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def measure(repeat):
+    """Return the results of the startup benchmarks, keyed by name, in the
+    form benchmarks.measure() returns them"""
+    scenario = schemas.small()
+    samples = [_run("time", scenario) for _ in range(repeat)]
+    peaks = _run("trace", scenario)
+    results = {}
+    for index, name in enumerate(NAMES):
+        best = min(sample[index] for sample in samples)
+        results[name] = {"ops": 1 / best, "peak_bytes": peaks[index]}
+    return results
@@ -12,13 +12,29 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import concurrent.futures
 import copy
+import io
+import itertools
 import json
+import mmap
+import operator
 import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import threading
 import unittest
 import warnings
 
+import jsonpatch
+
 import warlock
+import warlock.instrumentation
+import warlock.registry
+import warlock.serialization
 
 fixture = {
     "name": "Country",
@@ -69,6 +85,26 @@ default_values = {
     }
 }
 
+nested_fixture = {
+    "name": "Person",
+    "properties": {
+        "name": {"type": "string"},
+        "address": {
+            "type": "object",
+            "properties": {
+                "city": {"type": "string"},
+                "geo": {"type": "object", "properties": {"lat": {"type": "number"}}},
+            },
+            "required": ["city"],
+        },
+        "tags": {"type": "array", "items": {"type": "string"}, "maxItems": 3},
+        "pets": {
+            "type": "array",
+            "items": {"type": "object", "properties": {"name": {"type": "string"}}},
+        },
+    },
+}
+
 
 class TestCore(unittest.TestCase):
     def test_create_invalid_object(self):
@@ -146,6 +182,20 @@ class TestCore(unittest.TestCase):
         mike_1["sub"]["foo"] = "james"
         self.assertEqual("mike", mike.sub["foo"])
 
+        mike_2 = dict(mike.items())
+        self.assertEqual(mike_2, {"sub": {"foo": "mike"}})
+        self.assertRaises(TypeError, operator.setitem, mike_2["sub"], "foo", "james")
+        self.assertEqual("mike", mike.sub["foo"])
+
+        mike_3_sub = list(mike.values())[0]
+        self.assertRaises(TypeError, operator.setitem, mike_3_sub, "foo", "james")
+        self.assertEqual("mike", mike.sub["foo"])
+
+    def test_deepcopy_on_read(self):
+        Mixmaster = warlock.model_factory(complex_fixture)
+        Mixmaster.copy_on_read = True
+        mike = Mixmaster(sub={"foo": "mike"})
+
         mike_2 = dict(mike.items())
         mike_2["sub"]["foo"] = "james"
         self.assertEqual("mike", mike.sub["foo"])
@@ -154,6 +204,50 @@ class TestCore(unittest.TestCase):
         mike_3_sub["foo"] = "james"
         self.assertEqual("mike", mike.sub["foo"])
 
+    def test_read_views(self):
+        Parent = warlock.model_factory(parent_fixture)
+        mom = Parent(name="Abby", children=[{"name": "Bea", "tags": ["a"]}])
+
+        items = mom.items()
+        self.assertIn(("name", "Abby"), items)
+        children = dict(items)["children"]
+        self.assertEqual(children, [{"name": "Bea", "tags": ["a"]}])
+        self.assertEqual(children[0]["tags"], ["a"])
+        self.assertRaises(TypeError, operator.setitem, children, 0, {})
+        self.assertRaises(TypeError, children.append, {})
+        self.assertRaises(TypeError, operator.setitem, children[0]["tags"], 0, "b")
+
+        self.assertRaises(TypeError, dict(children[0])["tags"].append, "b")
+        self.assertRaises(TypeError, list(children)[0]["tags"].append, "b")
+
+        # Views are live and reading through them does not deep copy anything
+        self.assertEqual(mom._original, None)
+        mom.name = "Abigail"
+        self.assertIn("Abigail", mom.values())
+
+        # They are dicts and lists to json, jsonschema and the constructor
+        self.assertEqual(copy.deepcopy(children), [{"name": "Bea", "tags": ["a"]}])
+        self.assertIs(type(copy.deepcopy(children)[0]), dict)
+        self.assertEqual(json.loads(json.dumps(mom))["children"], children)
+        self.assertEqual(json.loads(json.dumps(mom, indent=2)), mom)
+        self.assertEqual(json.loads(json.dumps(dict(mom.items()))), mom)
+        self.assertEqual(pickle.loads(pickle.dumps(children)), children)
+        self.assertEqual({k: v for k, v in mom.items()}, mom)
+        rebuilt = Parent(dict(mom.items()))
+        rebuilt.children.append({"name": "Cy"})
+        self.assertEqual(len(mom.children), 1)
+
+        class Base(warlock.model.Model):
+            def items(self):
+                return super().items()
+
+        Subclassed = warlock.model_factory(parent_fixture, base_class=Base)
+        self.assertEqual(json.loads(json.dumps(Subclassed(mom.copy()))), mom)
+
+        # Nested views see changes made to the containers they were read from
+        mom.children[0]["tags"].append("b")
+        self.assertEqual(children[0]["tags"], ["a", "b"])
+
     def test_forbidden_methods(self):
         Country = warlock.model_factory(fixture)
         sweden = Country(name="Sweden", population=9379116)
@@ -255,6 +349,27 @@ class TestCore(unittest.TestCase):
         for patch in json.loads(sweden.patch):
             self.assertTrue(patch in patches)
 
+    def test_patch_setdefault_and_ior(self):
+        Country = warlock.model_factory(fixture)
+        sweden = Country(name="Sweden")
+        self.assertEqual(sweden.setdefault("population", 9379116), 9379116)
+        self.assertEqual(sweden.setdefault("name", "Finland"), "Sweden")
+        sweden |= {"name": "Norway"}
+        self.assertEqual(
+            sorted(json.loads(sweden.patch), key=lambda op: op["path"]),
+            [
+                {"op": "replace", "path": "/name", "value": "Norway"},
+                {"op": "add", "path": "/population", "value": 9379116},
+            ],
+        )
+
+        self.assertRaises(
+            warlock.InvalidOperation, sweden.setdefault, "overlord", "Bears"
+        )
+        with self.assertRaises(warlock.InvalidOperation):
+            sweden |= {"population": "N/A"}
+        self.assertEqual(sweden.population, 9379116)
+
     def test_resolver(self):
         from jsonschema import RefResolver
 
@@ -322,3 +437,1170 @@ class TestCore(unittest.TestCase):
         with_height = Person(height={"value": 120.0, "unit": "cm"})
         self.assertEqual(with_height.name, "Peter")
         self.assertEqual(with_height.height, {"value": 120.0, "unit": "cm"})
+
+    def test_validator_shared_by_instances(self):
+        Country = warlock.model_factory(fixture)
+        sweden = Country(name="Sweden", population=9379116)
+        finland = Country(name="Finland", population=5387000)
+
+        self.assertIsNotNone(Country.validator_instance)
+        self.assertIs(sweden.validator_instance, Country.validator_instance)
+        self.assertIs(finland.validator_instance, Country.validator_instance)
+        self.assertNotIn("validator_instance", sweden.__dict__)
+
+    def test_validator_shared_across_threads(self):
+        Country = warlock.model_factory(fixture)
+        errors = []
+
+        def build(offset):
+            try:
+                for i in range(200):
+                    country = Country(name="Sweden", population=offset + i)
+                    country.population = i
+                    self.assertRaises(ValueError, Country, name=offset)
+            except Exception as exc:  # pragma: no cover
+                errors.append(exc)
+
+        threads = [threading.Thread(target=build, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_warm(self):
+        from jsonschema import RefResolver
+
+        dirname = os.path.dirname(__file__)
+        schemas_path = "file://" + os.path.join(dirname, "schemas/")
+        resolver = RefResolver(schemas_path, None)
+
+        with open(os.path.join(dirname, "schemas", "country.json")) as fp:
+            country_schema = json.load(fp)
+        Country = warlock.model_factory(country_schema, resolver=resolver)
+        self.assertNotIn(schemas_path + "person.json", resolver.store)
+
+        Country.warm()
+        self.assertIn(schemas_path + "person.json", resolver.store)
+
+        england = Country(name="England", overlord={"title": "Queen"})
+        self.assertEqual(england.overlord, {"title": "Queen"})
+
+        # Models without a resolver have nothing to warm
+        warlock.model_factory(fixture).warm()
+
+    def test_incremental_validation(self):
+        schema = {
+            "properties": {
+                "name": {"type": "string"},
+                "population": {"type": "integer"},
+            },
+            "patternProperties": {"^x-": {"type": "string"}},
+            "required": ["name"],
+            "additionalProperties": False,
+        }
+        Country = warlock.model_factory(schema)
+        Country.incremental_validation = True
+        self.assertIsNotNone(Country._property_validator())
+
+        sweden = Country(name="Sweden", population=9379116)
+        sweden.population = 9453000
+        sweden["x-motto"] = "For Sweden"
+        sweden.update({"name": "Sverige", "x-anthem": "Du gamla"})
+        self.assertEqual(sweden.population, 9453000)
+        self.assertEqual(sweden["x-anthem"], "Du gamla")
+
+        exc = warlock.InvalidOperation
+        self.assertRaises(exc, setattr, sweden, "population", "N/A")
+        self.assertRaises(exc, setattr, sweden, "x-motto", 1)
+        self.assertRaises(exc, setattr, sweden, "overlord", "Bears")
+        self.assertRaises(exc, sweden.update, {"name": 5})
+        self.assertRaises(exc, delattr, sweden, "name")
+        self.assertEqual(sweden.name, "Sverige")
+
+        del sweden["population"]
+        self.assertNotIn("population", sweden)
+
+        # Errors read as they do when the whole document is validated
+        messages = {}
+        for incremental in (True, False):
+            Country.incremental_validation = incremental
+            messages[incremental] = []
+            for key, value in (("population", "N/A"), ("overlord", "Bears")):
+                with self.assertRaises(exc) as caught:
+                    sweden[key] = value
+                messages[incremental].append(str(caught.exception))
+            with self.assertRaises(exc) as caught:
+                del sweden["name"]
+            messages[incremental].append(str(caught.exception))
+        self.assertEqual(messages[True], messages[False])
+
+    def test_incremental_validation_fallback(self):
+        schema = {
+            "properties": {"low": {"type": "integer"}, "high": {"type": "integer"}},
+            "anyOf": [{"required": ["low"]}, {"required": ["high"]}],
+        }
+        Range = warlock.model_factory(schema)
+        Range.incremental_validation = True
+        self.assertIsNone(Range._property_validator())
+
+        bounds = Range(low=1, high=2)
+        del bounds["low"]
+        self.assertRaises(warlock.InvalidOperation, delattr, bounds, "high")
+        self.assertRaises(warlock.InvalidOperation, setattr, bounds, "high", "2")
+
+    def test_patch_baseline_is_lazy(self):
+        Mixmaster = warlock.model_factory(complex_fixture)
+        mike = Mixmaster(sub={"foo": "mike"}, name="Mike")
+        self.assertEqual(mike._original, None)
+
+        self.assertEqual(mike.name, "Mike")
+        self.assertEqual(mike._original, None)
+
+        self.assertEqual(mike.sub, {"foo": "mike"})
+        self.assertEqual(mike._original, None)
+
+        mike.sub = {"foo": "james"}
+        self.assertEqual(mike._original, {("sub",): {"foo": "mike"}})
+        self.assertEqual(
+            json.loads(mike.patch),
+            [{"op": "replace", "path": "/sub/foo", "value": "james"}],
+        )
+
+    def test_reads_leave_storage_alone(self):
+        Parent = warlock.model_factory(parent_fixture)
+        children = [{"name": "Bea", "tags": ["a"]}, {"name": "Cy", "tags": []}]
+        mom = Parent(name="Abby", children=children)
+
+        # Reading containers, however deep, records and copies nothing
+        warlock.instrumentation.enable()
+        self.addCleanup(warlock.instrumentation.reset)
+        self.addCleanup(warlock.instrumentation.disable)
+        self.assertIs(mom.children, children)
+        self.assertIs(type(mom["children"][0]["tags"]), list)
+        self.assertEqual(mom._original, None)
+        self.assertNotIn("copy", warlock.instrumentation.stats(Parent))
+
+        # Threads changing the same container in place lose nothing
+        def fill(prefix):
+            for i in range(1000):
+                mom.children[0]["%s%d" % (prefix, i)] = i
+
+        threads = [threading.Thread(target=fill, args=(p,)) for p in "xyz"]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(children[0]), 3002)
+
+        # Changes made in place during a batch are rolled back with it
+        with self.assertRaises(warlock.InvalidOperation):
+            with mom.batch():
+                mom.children[1]["tags"].append("x")
+                mom.name = 1
+        self.assertEqual(mom.children[1], {"name": "Cy", "tags": []})
+        self.assertEqual(mom.patch, "[]")
+
+    def test_patch_add_then_remove(self):
+        Country = warlock.model_factory(fixture)
+        sweden = Country(name="Sweden")
+        sweden.population = 9379116
+        self.assertEqual(
+            json.loads(sweden.patch),
+            [{"op": "add", "path": "/population", "value": 9379116}],
+        )
+        del sweden.population
+        self.assertEqual(sweden.patch, "[]")
+
+    def test_patch_operation_log(self):
+        Model = warlock.model_factory({"additionalProperties": {"type": "string"}})
+        doc = Model(dict(("key%d" % i, "value") for i in range(1000)))
+
+        doc["key1"] = "first"
+        doc["key1"] = "second"
+        doc.update({"a/b": "slash", "c~d": "tilde"})
+        doc["key2"] = "changed"
+        doc["key2"] = "value"
+        del doc["key3"]
+
+        self.assertEqual(len(doc._original), 5)
+        self.assertEqual(
+            json.loads(doc.patch),
+            [
+                {"op": "replace", "path": "/key1", "value": "second"},
+                {"op": "add", "path": "/a~1b", "value": "slash"},
+                {"op": "add", "path": "/c~0d", "value": "tilde"},
+                {"op": "remove", "path": "/key3"},
+            ],
+        )
+
+    def test_from_many(self):
+        Person = warlock.model_factory(default_values)
+        people = Person.from_many([{}, {"name": "Mary"}, {"height": {"value": 1.2}}])
+
+        self.assertEqual(len(people), 3)
+        self.assertIsInstance(people[0], Person)
+        self.assertEqual(people[0], {"name": "Peter", "height": {"unit": "m"}})
+        self.assertEqual(people[1].name, "Mary")
+        self.assertEqual(people[2].height, {"value": 1.2, "unit": "m"})
+
+        people[1].lastname = "Shelley"
+        self.assertEqual(people[1].lastname, "Shelley")
+
+    def test_from_many_collects_errors(self):
+        Country = warlock.model_factory(fixture)
+        records = [
+            {"name": "Sweden"},
+            {"name": 1},
+            {"population": "N/A"},
+            {"name": "Finland"},
+        ]
+        with self.assertRaises(warlock.exceptions.BatchValidationError) as cm:
+            Country.from_many(records)
+        self.assertIsInstance(cm.exception, ValueError)
+        self.assertEqual(sorted(cm.exception.errors), [1, 2])
+        self.assertIn("[1] 1 is not of type 'string'", str(cm.exception))
+
+    def test_from_many_executor(self):
+        Country = warlock.model_factory(fixture, compiled=True)
+        records = [{"name": "Sweden", "population": i} for i in range(50)]
+        records[7]["population"] = "N/A"
+        records[42]["name"] = 42
+
+        # Threads use the class's own compiled predicate and validator
+        compiled, checked = Country._compiled, []
+        Country._compiled = lambda obj: checked.append(obj) or compiled(obj)
+        executors = (
+            concurrent.futures.ThreadPoolExecutor(2),
+            concurrent.futures.ProcessPoolExecutor(2),
+        )
+        for executor in executors:
+            with executor:
+                with self.assertRaises(warlock.exceptions.BatchValidationError) as cm:
+                    Country.from_many(records, executor=executor, chunksize=10)
+                self.assertEqual(sorted(cm.exception.errors), [7, 42])
+
+                records[7]["population"] = 7
+                records[42]["name"] = "Sweden"
+                countries = Country.from_many(records, executor=executor, chunksize=10)
+                self.assertEqual([c.population for c in countries], list(range(50)))
+                records[7]["population"] = "N/A"
+                records[42]["name"] = 42
+        self.assertEqual(len(checked), 100)
+
+    def test_iter_load(self):
+        Country = warlock.model_factory(fixture)
+        records = [{"name": "Sweden", "population": 10**i} for i in range(20)]
+        ndjson = "".join(json.dumps(record) + "\n" for record in records)
+        array = " [ %s ] " % ", ".join(json.dumps(record) for record in records)
+
+        sources = [
+            io.StringIO(ndjson),
+            io.BytesIO(ndjson.encode("utf-8")),
+            io.StringIO(array),
+            array.encode("utf-8"),
+        ]
+        for source in sources:
+            # A tiny chunk size splits records and numbers across reads
+            countries = list(Country.iter_load(source, chunksize=7))
+            self.assertEqual(countries, records)
+            self.assertIsInstance(countries[0], Country)
+
+        with tempfile.TemporaryFile() as fp:
+            fp.write(array.encode("utf-8"))
+            fp.flush()
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                self.assertEqual(list(Country.iter_load(buf)), records)
+
+        Person = warlock.model_factory(default_values)
+        people = list(Person.iter_load(io.StringIO('{}\n{"name": "Mary"}')))
+        self.assertEqual(people[0], {"name": "Peter", "height": {"unit": "m"}})
+        people[1].lastname = "Shelley"
+        self.assertEqual(len(json.loads(people[1].patch)), 2)
+
+        for bad in ("[{}, {}", "[{} {}]", "[{}] {}"):
+            with self.assertRaises(json.JSONDecodeError):
+                list(Country.iter_load(io.StringIO(bad)))
+
+    def test_iter_load_errors(self):
+        Country = warlock.model_factory(fixture)
+        data = '[{"name": "Sweden"}, {"name": 1}, [], {"name": "Finland"}]'
+
+        countries = Country.iter_load(io.StringIO(data))
+        self.assertEqual(next(countries), {"name": "Sweden"})
+        with self.assertRaises(warlock.exceptions.BatchValidationError) as cm:
+            next(countries)
+        self.assertEqual(list(cm.exception.errors), [1])
+
+        countries = Country.iter_load(io.StringIO(data), on_error="skip")
+        self.assertEqual([c.name for c in countries], ["Sweden", "Finland"])
+
+        countries = Country.iter_load(io.StringIO(data), on_error="collect")
+        self.assertEqual(
+            [c.name for c in itertools.islice(countries, 2)], ["Sweden", "Finland"]
+        )
+        with self.assertRaises(warlock.exceptions.BatchValidationError) as cm:
+            next(countries)
+        self.assertEqual(sorted(cm.exception.errors), [1, 2])
+
+        with self.assertRaises(ValueError):
+            next(Country.iter_load(io.StringIO(data), on_error="ignore"))
+
+        # Each line of newline-delimited JSON is a record of its own, so a
+        # malformed one is an invalid record rather than the end of the input
+        data = '{"name": "Sweden"}\n{"name": \n\n{} {}\n{"name": "Finland"}'
+        countries = Country.iter_load(io.StringIO(data), chunksize=4)
+        self.assertEqual(next(countries), {"name": "Sweden"})
+        with self.assertRaises(warlock.exceptions.BatchValidationError) as cm:
+            next(countries)
+        self.assertIn("Malformed JSON", str(cm.exception.errors[1]))
+
+        countries = Country.iter_load(io.StringIO(data), on_error="skip")
+        self.assertEqual([c.name for c in countries], ["Sweden", "Finland"])
+
+        countries = Country.iter_load(io.StringIO(data), on_error="collect")
+        with self.assertRaises(warlock.exceptions.BatchValidationError) as cm:
+            list(countries)
+        self.assertEqual(sorted(cm.exception.errors), [1, 2])
+
+    def test_default_values_compiled(self):
+        schema = {
+            "definitions": {
+                "height": {
+                    "type": "object",
+                    "properties": {"unit": {"type": "string", "default": "m"}},
+                },
+                "tags": {"type": "array", "default": []},
+            },
+            "allOf": [{"properties": {"name": {"type": "string", "default": "Peter"}}}],
+            "properties": {
+                "height": {"$ref": "#/definitions/height"},
+                "tags": {"$ref": "#/definitions/tags"},
+                "unit": {"type": "string"},
+            },
+            "required": ["name"],
+        }
+        Person = warlock.model_factory(schema)
+        self.assertEqual(
+            Person._defaults,
+            [(("name",), "Peter"), (("height", "unit"), "m"), (("tags",), [])],
+        )
+
+        height = {"value": 1.2}
+        peter = Person(height=height, unit="ft")
+        self.assertEqual(
+            peter,
+            {
+                "name": "Peter",
+                "height": {"value": 1.2, "unit": "m"},
+                "tags": [],
+                "unit": "ft",
+            },
+        )
+        self.assertEqual(height, {"value": 1.2})
+
+        paul = Person()
+        paul.tags.append("tall")
+        self.assertEqual(Person().tags, [])
+
+        self.assertEqual(
+            sorted(json.loads(peter.patch), key=lambda op: op["path"]),
+            [
+                {"op": "add", "path": "/height/unit", "value": "m"},
+                {"op": "add", "path": "/name", "value": "Peter"},
+                {"op": "add", "path": "/tags", "value": []},
+            ],
+        )
+
+    def test_default_values_recursive_schema(self):
+        schema = {
+            "type": "object",
+            "properties": {
+                "label": {"type": "string", "default": "node"},
+                "child": {"$ref": "#"},
+            },
+        }
+        Node = warlock.model_factory(schema)
+        self.assertEqual(Node._defaults, [(("label",), "node")])
+        self.assertEqual(Node(child={}).child, {})
+
+    def test_model_cache(self):
+        cache = warlock.ModelCache(maxsize=2)
+        Country = warlock.model_factory(fixture, cache=cache)
+        reordered = dict(reversed(list(copy.deepcopy(fixture).items())))
+        self.assertIs(warlock.model_factory(reordered, cache=cache), Country)
+        self.assertEqual(cache.info(), (1, 1, 2, 1))
+
+        Renamed = warlock.model_factory(fixture, name="Land", cache=cache)
+        self.assertIsNot(Renamed, Country)
+        self.assertEqual(Renamed.__name__, "Land")
+
+        # Least recently used classes are evicted once the cache is full
+        warlock.model_factory(complex_fixture, cache=cache)
+        self.assertEqual(cache.info().currsize, 2)
+        self.assertIsNot(warlock.model_factory(fixture, cache=cache), Country)
+        self.assertEqual(cache.info().misses, 4)
+
+        cache.clear()
+        self.assertEqual(cache.info(), (0, 0, 2, 0))
+
+    def test_model_cache_options(self):
+        cache = warlock.ModelCache()
+        Country = warlock.model_factory(fixture, cache=cache)
+        Strict = warlock.model_factory(fixture, cache=cache, collect_errors=True)
+        self.assertIsNot(Strict, Country)
+        self.assertIs(
+            warlock.model_factory(fixture, cache=cache, collect_errors=True), Strict
+        )
+        self.assertFalse(Country.collect_errors)
+        self.assertTrue(Strict.collect_errors)
+        self.assertRaises(warlock.exceptions.DetailedValidationError, Strict, name=5)
+
+        Person = warlock.model_factory(
+            nested_fixture, nested=True, incremental_validation=True
+        )
+        self.assertTrue(Person._nested["address"].incremental_validation)
+        self.assertRaises(TypeError, warlock.model_factory, fixture, incremental=True)
+
+    def test_nested_models(self):
+        Person = warlock.model_factory(nested_fixture, nested=True)
+        data = {
+            "name": "Ada",
+            "address": {"city": "London", "geo": {"lat": 51.5}},
+            "tags": ["maths"],
+            "pets": [{"name": "Tom"}],
+        }
+        ada = Person(copy.deepcopy(data))
+
+        self.assertEqual(ada, data)
+        self.assertEqual(json.loads(json.dumps(ada)), data)
+        self.assertIsInstance(ada.address, warlock.model.Model)
+        self.assertEqual(type(ada.address).__name__, "address")
+        self.assertIsInstance(ada.address.geo, warlock.model.Model)
+        self.assertIsInstance(ada.tags, warlock.model.ModelList)
+        self.assertIsInstance(ada.pets[0], warlock.model.Model)
+        self.assertEqual(ada._original, None)
+
+        exc = warlock.InvalidOperation
+        self.assertRaises(exc, setattr, ada.address, "city", 5)
+        self.assertRaises(exc, delattr, ada.address, "city")
+        self.assertRaises(exc, ada.tags.append, 5)
+        self.assertRaises(exc, ada.tags.extend, ["a", "b", "c"])
+        self.assertRaises(exc, setattr, ada.pets[0], "name", 5)
+        self.assertEqual(ada, data)
+        self.assertEqual(ada.patch, "[]")
+
+        ada.address.city = "Marylebone"
+        ada.address.geo.lat = 51.52
+        ada.tags.append("poetry")
+        ada.pets[0].name = "Puss"
+        self.assertEqual(
+            json.loads(ada.patch),
+            [
+                {"op": "replace", "path": "/address/city", "value": "Marylebone"},
+                {"op": "replace", "path": "/address/geo/lat", "value": 51.52},
+                {"op": "add", "path": "/tags/1", "value": "poetry"},
+                {"op": "replace", "path": "/pets/0/name", "value": "Puss"},
+            ],
+        )
+
+    def test_nested_models_replaced(self):
+        Person = warlock.model_factory(nested_fixture, nested=True)
+        data = {"address": {"city": "London", "geo": {"lat": 51.5}}}
+        ada = Person(copy.deepcopy(data))
+
+        old_address = ada.address
+        ada.address.geo.lat = 0
+        ada.address = {"city": "Paris"}
+        self.assertIsInstance(ada.address, warlock.model.Model)
+        ada.address.geo = {"lat": 48.9}
+        self.assertIsInstance(ada.address.geo, warlock.model.Model)
+
+        # Detached children no longer report to their old parent
+        old_address.city = "Oxford"
+        self.assertEqual(ada.address.city, "Paris")
+
+        self.assertEqual(list(ada._original), [("address",)])
+        patched = jsonpatch.apply_patch(data, json.loads(ada.patch))
+        self.assertEqual(patched, {"address": {"city": "Paris", "geo": {"lat": 48.9}}})
+
+    def test_nested_models_recursive(self):
+        schema = {
+            "type": "object",
+            "properties": {
+                "label": {"type": "string"},
+                "children": {"type": "array", "items": {"$ref": "#"}},
+            },
+        }
+        Node = warlock.model_factory(schema, nested=True)
+        root = Node(label="a", children=[{"label": "b", "children": []}])
+        self.assertIsInstance(root.children[0], Node)
+
+        root.children[0].children.append({"label": "c"})
+        self.assertIsInstance(root.children[0].children[0], Node)
+        self.assertRaises(
+            warlock.InvalidOperation, setattr, root.children[0].children[0], "label", 1
+        )
+        self.assertEqual(
+            json.loads(root.patch),
+            [{"op": "add", "path": "/children/0/children/0", "value": {"label": "c"}}],
+        )
+
+    def test_bookkeeping_slots(self):
+        Country = warlock.model_factory(fixture)
+        sweden = Country(name="Sweden", population=9379116)
+        self.assertIsNone(sweden._changes)
+
+        sweden.name = "Finland"
+        self.assertEqual(sweden._changes, {"name": "Finland"})
+        self.assertEqual(sweden.__dict__, {})
+
+    def test_compiled_validation(self):
+        schema = {
+            "name": "Account",
+            "type": "object",
+            "required": ["user"],
+            "properties": {
+                "user": {"type": "string", "minLength": 2, "pattern": "^[a-z]+$"},
+                "role": {"enum": ["admin", "member", None]},
+                "age": {"type": "integer", "minimum": 0},
+                "ids": {"type": "array", "items": {"type": "integer"}, "maxItems": 2},
+                # Not compiled, so left to jsonschema
+                "contact": {"anyOf": [{"type": "string"}, {"type": "null"}]},
+                "home": {"$ref": "#/definitions/address"},
+            },
+            "definitions": {"address": {"type": "object", "required": ["city"]}},
+            "additionalProperties": False,
+        }
+        Account = warlock.model_factory(schema)
+        Compiled = warlock.model_factory(schema, compiled=True)
+        self.assertIsNotNone(Compiled._compiled)
+        self.assertIsNone(Account._compiled)
+
+        valid = {"user": "ada", "role": None, "age": 36, "ids": [1], "contact": None}
+        invalid = [
+            {},
+            {"user": "a"},
+            {"user": "Ada"},
+            {"user": "ada", "role": "owner"},
+            {"user": "ada", "age": -1},
+            {"user": "ada", "age": True},
+            {"user": "ada", "ids": [1, 2, 3]},
+            {"user": "ada", "ids": ["1"]},
+            {"user": "ada", "contact": 5},
+            {"user": "ada", "home": {}},
+            {"user": "ada", "extra": 1},
+        ]
+        self.assertEqual(Compiled(valid), valid)
+        for record in invalid:
+            with self.assertRaises(ValueError) as expected:
+                Account(record)
+            with self.assertRaises(ValueError) as actual:
+                Compiled(record)
+            self.assertEqual(str(actual.exception), str(expected.exception))
+
+        account = Compiled(valid)
+        self.assertRaises(warlock.InvalidOperation, setattr, account, "age", 1.5)
+        account.age = 37
+
+        cache = warlock.ModelCache()
+        self.assertIsNot(
+            warlock.model_factory(schema, cache=cache),
+            warlock.model_factory(schema, cache=cache, compiled=True),
+        )
+
+        Person = warlock.model_factory(nested_fixture, nested=True, compiled=True)
+        ada = Person(address={"city": "London"}, tags=["a"])
+        self.assertIsNotNone(type(ada.address)._compiled)
+        self.assertRaises(warlock.InvalidOperation, setattr, ada.address, "city", 1)
+        self.assertRaises(warlock.InvalidOperation, ada.tags.extend, ["b", "c", "d"])
+
+    def test_instrumentation(self):
+        instrumentation = warlock.instrumentation
+        events = []
+        Country = warlock.model_factory(fixture)
+        Country(name="Sweden")
+        self.assertEqual(instrumentation.stats(Country), {})
+
+        instrumentation.enable()
+        self.addCleanup(instrumentation.reset)
+        self.addCleanup(instrumentation.disable)
+        callback = instrumentation.subscribe(lambda *args: events.append(args))
+        self.addCleanup(instrumentation.unsubscribe, callback)
+
+        Country = warlock.model_factory(fixture)
+        sweden = Country(name="Sweden")
+        self.assertRaises(ValueError, Country, name=1)
+        sweden.population = 10
+        self.assertRaises(warlock.InvalidOperation, setattr, sweden, "name", 1)
+        sweden.patch
+        copy.deepcopy(sweden)
+
+        stats = instrumentation.stats(Country)
+        self.assertEqual(stats["factory"].count, 1)
+        self.assertEqual(stats["construct"].count, 1)
+        self.assertEqual(stats["validate"].count, 4)
+        self.assertEqual(stats["validation_failure"].count, 2)
+        self.assertEqual(stats["patch"].count, 1)
+        self.assertEqual(stats["copy"].count, 1)
+        self.assertEqual(sum(stats["validate"].buckets), 4)
+        self.assertGreater(stats["validate"].total, 0)
+
+        self.assertEqual(len(events), 10)
+        self.assertEqual(events[0][:2], ("factory", Country))
+        self.assertIsInstance(events[0][2], float)
+
+        instrumentation.disable()
+        Country(name="Finland")
+        self.assertEqual(instrumentation.stats(Country)["construct"].count, 1)
+
+    def test_instrumentation_counts_every_construction(self):
+        instrumentation = warlock.instrumentation
+        Country = warlock.model_factory(fixture)
+        Offloaded = warlock.model_factory(fixture, async_threshold=0)
+        instrumentation.enable()
+        self.addCleanup(instrumentation.reset)
+        self.addCleanup(instrumentation.disable)
+
+        sweden = Country(name="Sweden")
+        Country.trusted(name="Norway")
+        Country.from_many([{"name": "Denmark"}, {"name": "Finland"}])
+        ndjson = io.BytesIO(b'{"name": "Iceland"}\n{"name": 1}\n')
+        list(Country.iter_load(ndjson, on_error="skip"))
+        Country.from_json('{"name": "Estonia"}')
+        sweden.fork()
+        asyncio.run(Offloaded.acreate(name="Latvia"))
+
+        self.assertEqual(instrumentation.stats(Country)["construct"].count, 7)
+        self.assertEqual(instrumentation.stats(Offloaded)["construct"].count, 1)
+
+    def test_batch(self):
+        schema = {
+            "$schema": "http://json-schema.org/draft-07/schema#",
+            "name": "Range",
+            "properties": {
+                "low": {"type": "integer"},
+                "high": {"type": "integer"},
+                "label": {"type": "string"},
+                "meta": {"type": "object"},
+            },
+            "dependencies": {"low": ["high"], "high": ["low"]},
+            "additionalProperties": False,
+        }
+        Range = warlock.model_factory(schema)
+        r = Range(label="empty", meta={"a": 1})
+        self.assertRaises(warlock.InvalidOperation, setattr, r, "low", 1)
+
+        warlock.instrumentation.enable()
+        self.addCleanup(warlock.instrumentation.reset)
+        self.addCleanup(warlock.instrumentation.disable)
+        with r.batch() as batch:
+            self.assertIs(batch, r)
+            r.low = 1
+            r.high = 2
+            r.low = 0
+            with r.batch():
+                del r["label"]
+        warlock.instrumentation.disable()
+        self.assertEqual(warlock.instrumentation.stats(Range)["validate"].count, 1)
+        self.assertEqual(r, {"low": 0, "high": 2, "meta": {"a": 1}})
+        self.assertEqual(
+            sorted(json.loads(r.patch), key=operator.itemgetter("path")),
+            [
+                {"op": "add", "path": "/high", "value": 2},
+                {"op": "remove", "path": "/label"},
+                {"op": "add", "path": "/low", "value": 0},
+            ],
+        )
+
+        patch = r.patch
+        with self.assertRaises(warlock.InvalidOperation):
+            with r.batch():
+                r.label = "restored"
+                del r["high"]
+                r.meta["b"] = 2
+                r.extra = True
+        self.assertEqual(r, {"low": 0, "high": 2, "meta": {"a": 1}})
+        self.assertEqual(r.patch, patch)
+
+        with self.assertRaises(KeyError):
+            with r.batch():
+                r.high = 3
+                r["missing"]
+        self.assertEqual(r.high, 2)
+
+        Person = warlock.model_factory(nested_fixture, nested=True)
+        ada = Person(address={"city": "London"})
+        with self.assertRaises(RuntimeError):
+            with ada.batch():
+                ada.address.city = "Paris"
+                raise RuntimeError()
+        self.assertEqual(ada.address.city, "London")
+        ada.address.city = "Paris"
+        self.assertEqual(len(json.loads(ada.patch)), 1)
+
+    def test_registry(self):
+        dirname = os.path.dirname(__file__)
+        registry = warlock.registry.SchemaRegistry.from_directory(
+            os.path.join(dirname, "schemas")
+        )
+        with open(os.path.join(dirname, "schemas", "country.json")) as fp:
+            country_schema = json.load(fp)
+
+        Country = warlock.model_factory(country_schema, registry=registry)
+        overlord = {"title": "Mr", "firstname": "Malcolm", "lastname": "Tucker"}
+        sweden = Country(name="Sweden", overlord=overlord)
+        self.assertEqual(sweden.overlord, overlord)
+        self.assertRaises(ValueError, Country, overlord={"title": 1})
+        self.assertIs(Country.registry, registry.registry)
+
+        def validate():
+            for _ in range(50):
+                Country(name="Sweden", overlord=overlord)
+
+        threads = [threading.Thread(target=validate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        fetched = []
+
+        def retrieve(uri):
+            fetched.append(uri)
+            return {"type": "string", "maxLength": 3}
+
+        registry = warlock.registry.SchemaRegistry(retrieve=retrieve)
+        schema = {"properties": {"code": {"$ref": "http://example.com/code"}}}
+        First = warlock.model_factory(schema, registry=registry)
+        Second = warlock.model_factory(dict(schema, name="Second"), registry=registry)
+        self.assertRaises(ValueError, First, code="SWEDEN")
+        Second(code="SE")
+        First(code="FI")
+        self.assertEqual(fetched, ["http://example.com/code"])
+
+        cache = warlock.ModelCache()
+        self.assertIsNot(
+            warlock.model_factory(schema, cache=cache),
+            warlock.model_factory(schema, cache=cache, registry=registry),
+        )
+
+    def test_trusted(self):
+        Mixmaster = warlock.model_factory(complex_fixture)
+        warlock.instrumentation.enable()
+        self.addCleanup(warlock.instrumentation.reset)
+        self.addCleanup(warlock.instrumentation.disable)
+
+        m = Mixmaster.trusted({"sub": {"foo": 1}})
+        self.assertIsInstance(m, Mixmaster)
+        self.assertEqual(m.sub, {"foo": 1})
+        self.assertEqual(dict(m.items()), {"sub": {"foo": 1}})
+        self.assertNotIn("validate", warlock.instrumentation.stats(Mixmaster))
+
+        self.assertRaises(warlock.exceptions.ValidationError, m.validate)
+        with self.assertRaises(warlock.InvalidOperation):
+            m.other = 1
+        self.assertNotIn("other", m)
+        with self.assertRaises(warlock.InvalidOperation):
+            with m.batch():
+                m.other = 1
+
+        m = Mixmaster.trusted(sub={"foo": "bar"})
+        m.other = 1
+        m.another = 2
+        self.assertEqual(warlock.instrumentation.stats(Mixmaster)["validate"].count, 5)
+        self.assertEqual(len(json.loads(m.patch)), 2)
+
+        class Lazy(warlock.model.Model):
+            lazy_validation = True
+            incremental_validation = True
+
+        Country = warlock.model_factory(fixture, base_class=Lazy)
+        sweden = Country(name=1)
+        self.assertEqual(Country.from_many([{"name": 2}])[0].name, 2)
+        self.assertRaises(warlock.InvalidOperation, setattr, sweden, "population", 1)
+        sweden = Country(name="Sweden")
+        sweden.validate()
+        sweden.population = 1
+
+        Person = warlock.model_factory(nested_fixture, nested=True)
+        ada = Person.trusted(name=1, address={"city": "London"})
+        self.assertEqual(ada.address.city, "London")
+        self.assertRaises(warlock.InvalidOperation, setattr, ada.address, "city", "X")
+        self.assertEqual(ada.address.city, "London")
+
+    def test_serialization(self):
+        Person = warlock.model_factory(nested_fixture, nested=True)
+        ada = Person(
+            name="Ada Lovelace ✓",
+            address={"city": "London", "geo": {"lat": 51.5}},
+            tags=["a", "b"],
+            pets=[{"name": "Puss"}],
+        )
+        expected = (
+            '{"name":"Ada Lovelace ✓","address":{"city":"London","geo":{"lat":51.5}},'
+            '"tags":["a","b"],"pets":[{"name":"Puss"}]}'
+        )
+
+        Counter = warlock.model_factory(
+            {"name": "Counter", "properties": {"n": {"type": "integer"}}}
+        )
+
+        backends = set([warlock.serialization.orjson, None])
+        self.addCleanup(
+            setattr, warlock.serialization, "orjson", warlock.serialization.orjson
+        )
+        for backend in backends:
+            warlock.serialization.orjson = backend
+            self.assertEqual(ada.to_json(), expected)
+            self.assertEqual(ada.to_bytes(), expected.encode("utf-8"))
+            text, binary = io.StringIO(), io.BytesIO()
+            ada.to_json(text)
+            ada.to_bytes(binary)
+            self.assertEqual(text.getvalue(), expected)
+            self.assertEqual(binary.getvalue(), expected.encode("utf-8"))
+
+            for data in (
+                expected,
+                expected.encode("utf-8"),
+                io.BytesIO(binary.getvalue()),
+            ):
+                loaded = Person.from_json(data)
+                self.assertEqual(loaded, ada)
+                self.assertIsInstance(loaded.address, warlock.model.Model)
+                self.assertEqual(loaded.patch, "[]")
+
+            self.assertRaises(ValueError, Person.from_json, '{"name": 1}')
+            self.assertRaises(ValueError, Person.from_json, "[]")
+            self.assertRaises(ValueError, Person.from_json, "{")
+
+            big = Counter(n=2**70)
+            self.assertEqual(big.to_json(), '{"n":%d}' % 2**70)
+            binary = io.BytesIO()
+            big.to_bytes(binary)
+            self.assertEqual(binary.getvalue(), b'{"n":%d}' % 2**70)
+
+    def test_async(self):
+        class Counting(concurrent.futures.ThreadPoolExecutor):
+            calls = 0
+
+            def submit(self, *args, **kwargs):
+                Counting.calls += 1
+                return super().submit(*args, **kwargs)
+
+        class Offloaded(warlock.model.Model):
+            async_executor = Counting(1)
+            async_threshold = 3
+
+        self.addCleanup(Offloaded.async_executor.shutdown)
+        Person = warlock.model_factory(default_values, base_class=Offloaded)
+
+        async def create(*args, **kwargs):
+            return await Person.acreate(*args, **kwargs)
+
+        mary = asyncio.run(create(name="Mary"))
+        self.assertEqual(Counting.calls, 0)
+        self.assertEqual(mary, Person(name="Mary"))
+        mary.lastname = "Shelley"
+
+        large = {"name": "Mary", "lastname": "Shelley", "height": {"value": 1.6}}
+        mary = asyncio.run(create(large))
+        self.assertEqual(Counting.calls, 1)
+        self.assertEqual(mary.height, {"value": 1.6, "unit": "m"})
+        self.assertEqual(mary.patch, Person(large).patch)
+
+        large["height"]["value"] = "tall"
+        with self.assertRaises(ValueError) as expected:
+            Person(large)
+        with self.assertRaises(ValueError) as actual:
+            asyncio.run(create(large))
+        self.assertEqual(str(actual.exception), str(expected.exception))
+
+        mary = Person.trusted(large)
+        with self.assertRaises(warlock.exceptions.ValidationError):
+            asyncio.run(mary.avalidate())
+        asyncio.run(mary.avalidate({"name": "Mary"}))
+        self.assertEqual(Counting.calls, 3)
+
+        with concurrent.futures.ProcessPoolExecutor(1) as executor:
+            Offloaded.async_executor = executor
+            with self.assertRaises(warlock.exceptions.ValidationError) as actual:
+                asyncio.run(mary.avalidate())
+            self.assertEqual(str(actual.exception), str(expected.exception))
+            large["height"]["value"] = 1.6
+            asyncio.run(Person.trusted(large).avalidate())
+
+    def test_apply_patch(self):
+        schema = {
+            "name": "Resource",
+            "properties": {
+                "name": {"type": "string"},
+                "size": {"type": "integer", "minimum": 0},
+                "tags": {"type": "array", "items": {"type": "string"}},
+                "address": {
+                    "type": "object",
+                    "properties": {"city": {"type": "string"}},
+                },
+                "backup": {"type": "object"},
+            },
+            "additionalProperties": False,
+        }
+        Resource = warlock.model_factory(schema, nested=True)
+        r = Resource(name="disk", size=1, tags=["a"], address={"city": "Oslo"})
+        r.apply_patch(
+            [
+                {"op": "test", "path": "/name", "value": "disk"},
+                {"op": "replace", "path": "/size", "value": 2},
+                {"op": "add", "path": "/tags/-", "value": "b"},
+                {"op": "replace", "path": "/address/city", "value": "Bergen"},
+                {"op": "copy", "from": "/address", "path": "/backup"},
+            ]
+        )
+        self.assertEqual(r.size, 2)
+        self.assertEqual(r.tags, ["a", "b"])
+        self.assertEqual(r.address.city, "Bergen")
+        self.assertIsInstance(r.address, warlock.model.Model)
+        self.assertEqual(r.backup, {"city": "Bergen"})
+        self.assertEqual(
+            sorted(json.loads(r.patch), key=operator.itemgetter("path")),
+            [
+                {"op": "replace", "path": "/address/city", "value": "Bergen"},
+                {"op": "add", "path": "/backup", "value": {"city": "Bergen"}},
+                {"op": "replace", "path": "/size", "value": 2},
+                {"op": "add", "path": "/tags/1", "value": "b"},
+            ],
+        )
+
+        r.apply_patch('[{"op": "move", "from": "/backup", "path": "/address"}]')
+        r.apply_patch(jsonpatch.JsonPatch([{"op": "remove", "path": "/tags"}]))
+        self.assertEqual(r, {"name": "disk", "size": 2, "address": {"city": "Bergen"}})
+
+        invalid = [
+            [
+                {"op": "replace", "path": "/size", "value": 3},
+                {"op": "remove", "path": "/x"},
+            ],
+            [
+                {"op": "replace", "path": "/size", "value": 3},
+                {"op": "test", "path": "/name", "value": "x"},
+            ],
+            [
+                {"op": "replace", "path": "/size", "value": 3},
+                {"op": "add", "path": "/extra", "value": 1},
+            ],
+            [{"op": "replace", "path": "/address/city", "value": 3}],
+            [{"op": "replace", "path": "", "value": []}],
+            [{"op": "frobnicate", "path": "/size"}],
+        ]
+        for operations in invalid:
+            self.assertRaises(warlock.InvalidOperation, r.apply_patch, operations)
+            self.assertEqual(
+                r, {"name": "disk", "size": 2, "address": {"city": "Bergen"}}
+            )
+
+        # Only the properties a patch changes are revalidated
+        dict.__setitem__(r, "name", 5)
+        r.apply_patch([{"op": "replace", "path": "/size", "value": 4}])
+        self.assertEqual(r.size, 4)
+        self.assertRaises(
+            warlock.InvalidOperation,
+            r.apply_patch,
+            [{"op": "replace", "path": "", "value": {"name": 5}}],
+        )
+        r.apply_patch([{"op": "replace", "path": "", "value": {"name": "root"}}])
+        self.assertEqual(r, {"name": "root"})
+
+    def test_fork(self):
+        schema = {
+            "name": "Tenant",
+            "properties": {
+                "name": {"type": "string"},
+                "limits": {"type": "object"},
+                "tags": {"type": "array", "items": {"type": "string"}},
+                "owner": {
+                    "type": "object",
+                    "properties": {"emails": {"type": "array"}},
+                },
+            },
+            "additionalProperties": False,
+        }
+        Tenant = warlock.model_factory(schema)
+        template = Tenant(name="template", limits={"cpu": 1}, tags=["a"])
+        template.name = "base"
+
+        warlock.instrumentation.enable()
+        self.addCleanup(warlock.instrumentation.reset)
+        self.addCleanup(warlock.instrumentation.disable)
+        tenant = template.fork()
+        warlock.instrumentation.disable()
+        stats = warlock.instrumentation.stats(Tenant)
+        self.assertNotIn("validate", stats)
+        self.assertEqual(stats["copy"].count, 1)
+
+        self.assertIsInstance(tenant, Tenant)
+        self.assertEqual(tenant, template)
+        self.assertEqual(tenant.patch, "[]")
+
+        # Each model changes its own containers
+        tenant.limits["cpu"] = 2
+        tenant.tags.append("b")
+        self.assertEqual(
+            template, {"name": "base", "limits": {"cpu": 1}, "tags": ["a"]}
+        )
+        template.limits["cpu"] = 3
+        self.assertEqual(tenant.limits, {"cpu": 2})
+        tenant.limits = {"cpu": 4}
+        tenant.tags = ["a", "b", "c"]
+        self.assertEqual(
+            json.loads(tenant.patch),
+            [
+                {"op": "replace", "path": "/limits/cpu", "value": 4},
+                {"op": "add", "path": "/tags/2", "value": "c"},
+            ],
+        )
+        self.assertEqual(
+            json.loads(template.fork(keep_patch=True).patch),
+            json.loads(template.patch),
+        )
+
+        # Containers the source has already handed out are not shared
+        limits = template.limits
+        fork = template.fork()
+        limits["memory"] = 1
+        self.assertNotIn("memory", fork.limits)
+        self.assertRaises(warlock.InvalidOperation, setattr, fork, "name", 1)
+
+        # Nor is anything taken out of the source's containers afterwards
+        Doc = warlock.model_factory(
+            {"properties": {"sub": {"type": "object"}, "arr": {"type": "array"}}}
+        )
+        source = Doc(sub={"deep": {"x": 1}, "other": {"y": 1}}, arr=[{"z": 1}])
+        fork = source.fork()
+        source.sub.pop("deep")["x"] = 99
+        dict(source.sub)["other"]["y"] = 99
+        (source.sub | {})["other"]["z"] = 99
+        source.arr.pop()["z"] = 99
+        self.assertEqual(
+            fork, {"sub": {"deep": {"x": 1}, "other": {"y": 1}}, "arr": [{"z": 1}]}
+        )
+        self.assertEqual(fork.patch, "[]")
+
+        Nested = warlock.model_factory(schema, nested=True)
+        source = Nested(name="n", owner={"emails": ["a@b"]}, tags=["x"])
+        fork = source.fork()
+        self.assertIsNot(fork.owner, source.owner)
+        self.assertIsInstance(fork.owner, warlock.model.Model)
+        fork.owner.emails.append("c@d")
+        fork.tags.append("y")
+        self.assertEqual(
+            source, {"name": "n", "owner": {"emails": ["a@b"]}, "tags": ["x"]}
+        )
+        self.assertEqual(
+            sorted(json.loads(fork.patch), key=operator.itemgetter("path")),
+            [
+                {"op": "add", "path": "/owner/emails/1", "value": "c@d"},
+                {"op": "add", "path": "/tags/1", "value": "y"},
+            ],
+        )
+        self.assertRaises(warlock.InvalidOperation, fork.tags.append, 1)
+
+        trusted = Tenant.trusted(name=1)
+        self.assertRaises(warlock.InvalidOperation, setattr, trusted.fork(), "tags", [])
+
+    def test_lazy_imports(self):
+        script = (
+            "import sys, warlock; "
+            "print(sorted(set(sys.modules) & {'jsonschema', 'jsonpatch', "
+            "'asyncio', 'warlock.model'})); "
+            "warlock.model_factory({}); "
+            "print('jsonpatch' in sys.modules, warlock.model.Model.__name__)"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(warlock.__file__)))
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            check=True,
+            cwd=root,
+            text=True,
+        ).stdout
+        self.assertEqual(output.splitlines(), ["[]", "False Model"])
+        self.assertRaises(AttributeError, getattr, warlock, "missing")
+
+    def test_collect_errors(self):
+        schema = {
+            "name": "Person",
+            "properties": {
+                "name": {"type": "string"},
+                "age": {"type": "integer", "minimum": 0},
+                "tags": {"type": "array", "items": {"type": "string"}},
+            },
+            "required": ["name"],
+            "additionalProperties": False,
+        }
+        Person = warlock.model_factory(schema)
+        with self.assertRaises(ValueError) as plain:
+            Person(age=-1)
+        self.assertNotIsInstance(plain.exception, warlock.exceptions.ValidationError)
+
+        class Collecting(warlock.model.Model):
+            collect_errors = True
+
+        Person = warlock.model_factory(schema, base_class=Collecting)
+        with self.assertRaises(ValueError) as actual:
+            Person({"age": -1, "tags": ["a", 2], "a/b": 1})
+        exc = actual.exception
+        self.assertIsInstance(exc, warlock.exceptions.DetailedValidationError)
+        self.assertEqual(
+            [(e.path, e.keyword) for e in exc.errors],
+            [
+                ("/age", "minimum"),
+                ("/tags/1", "type"),
+                ("", "required"),
+                ("", "additionalProperties"),
+            ],
+        )
+        self.assertEqual(exc.errors[0].message, "-1 is less than the minimum of 0")
+        self.assertTrue(str(exc).startswith("4 validation error(s): /age: -1 is"))
+
+        ada = Person(name="Ada", age=36)
+        with self.assertRaises(warlock.exceptions.DetailedValidationError) as actual:
+            ada.validate({"name": 1, "age": "old"})
+        self.assertEqual([e.path for e in actual.exception.errors], ["/name", "/age"])
+
+        for incremental in (False, True):
+            Person.incremental_validation = incremental
+            with self.assertRaises(warlock.InvalidOperation) as actual:
+                ada.tags = ["a", 1, 2]
+            self.assertEqual(
+                [e.path for e in actual.exception.errors], ["/tags/1", "/tags/2"]
+            )
+            self.assertIsInstance(
+                actual.exception.__cause__, warlock.exceptions.DetailedValidationError
+            )
+        self.assertEqual(ada, {"name": "Ada", "age": 36})
+
+        writes = [
+            lambda: ada.update({"age": -1, "tags": [1]}),
+            lambda: ada.apply_patch([{"op": "add", "path": "/age", "value": -1}]),
+            lambda: delattr(ada, "name"),
+        ]
+        for write in writes:
+            with self.assertRaises(warlock.InvalidOperation) as actual:
+                write()
+            self.assertTrue(actual.exception.errors)
+        with self.assertRaises(warlock.InvalidOperation) as actual:
+            with ada.batch():
+                ada.age = -1
+                ada.name = 1
+        self.assertEqual([e.path for e in actual.exception.errors], ["/name", "/age"])
+        self.assertIsNone(warlock.InvalidOperation().errors)
+
+        records = [{"name": "Bob"}, {"name": 2, "age": -2}]
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            for pool in (None, executor):
+                with self.assertRaises(
+                    warlock.exceptions.BatchValidationError
+                ) as actual:
+                    Person.from_many(records, executor=pool)
+                errors = actual.exception.errors[1].errors
+                self.assertEqual([e.path for e in errors], ["/name", "/age"])
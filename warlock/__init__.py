@@ -14,7 +14,19 @@
 
 """Python object model built on JSON schema and JSON patch."""
 
-from warlock.core import model_factory  # noqa: F401
+import importlib
+
+from warlock.core import ModelCache, model_factory  # noqa: F401
 from warlock.exceptions import InvalidOperation  # noqa: F401
 
 __version__ = "2.1.0"
+
+# Submodules that import jsonschema, or are only needed by some callers, are
+# loaded on first use rather than by `import warlock`
+_LAZY_SUBMODULES = ("compiler", "model", "registry", "serialization", "stream", "views")
+
+
+def __getattr__(name):
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module("warlock." + name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
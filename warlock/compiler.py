@@ -0,0 +1,252 @@
+# Copyright 2012 Brian Waldon
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compilation of JSON schemas into specialized validation functions"""
+
+import numbers
+import re
+
+# Keywords that never affect whether an instance is valid
+_IGNORED = frozenset(["$schema", "$comment", "$defs", "definitions"])
+
+
+def compile_validator(validator):
+    """Compile the schema of a jsonschema validator into a predicate
+
+    The predicate returns True for instances the schema accepts, and False
+    for those it may reject. Subschemas using keywords that are not
+    compiled are checked by the validator itself, so the predicate always
+    agrees with it on valid instances. Returns None if the schema's draft is
+    not supported.
+    """
+    if "draft-03" in getattr(validator, "META_SCHEMA", {}).get("$schema", ""):
+        return None
+    return _Compiler(validator).compile(validator.schema, root=True)
+
+
+def _always(instance):
+    return True
+
+
+def _never(instance):
+    return False
+
+
+class _Compiler:
+    def __init__(self, validator):
+        self.validator = validator
+        self.keywords = type(validator).VALIDATORS
+        self.types = {
+            "string": lambda x: isinstance(x, str),
+            "object": lambda x: isinstance(x, dict),
+            "array": lambda x: isinstance(x, list),
+            "boolean": lambda x: isinstance(x, bool),
+            "null": lambda x: x is None,
+            "number": _is_number,
+        }
+        # Draft 4 does not count 1.0 as an integer, later drafts do
+        if validator.is_type(1.0, "integer"):
+            self.types["integer"] = _is_integral
+        else:
+            self.types["integer"] = _is_int
+
+    def compile(self, schema, root=False):
+        if schema is True:
+            return _always
+        if schema is False:
+            return _never
+        if not isinstance(schema, dict):
+            return self.fallback(schema)
+        if not root and ("$id" in schema or isinstance(schema.get("id"), str)):
+            # Leave scope changes to the validator
+            return self.fallback(schema)
+
+        checks = []
+        for keyword, value in schema.items():
+            if keyword in _IGNORED or keyword not in self.keywords:
+                continue
+            compile_keyword = getattr(self, "_" + keyword, None)
+            check = None if compile_keyword is None else compile_keyword(value, schema)
+            if check is None:
+                return self.fallback(schema)
+            if check is not _always:
+                checks.append(check)
+        return _all(checks)
+
+    def fallback(self, schema):
+        return self.validator.evolve(schema=schema).is_valid
+
+    def _type(self, value, schema):
+        names = [value] if isinstance(value, str) else value
+        if not isinstance(names, list) or not all(n in self.types for n in names):
+            return None
+        checks = [self.types[name] for name in names]
+        if len(checks) == 1:
+            return checks[0]
+        return lambda x: any(check(x) for check in checks)
+
+    def _enum(self, value, schema):
+        # Only enums where equality can't mix up bools and numbers
+        if not isinstance(value, list):
+            return None
+        strings = frozenset(v for v in value if isinstance(v, str))
+        nullable = any(v is None for v in value)
+        if not all(v is None or isinstance(v, str) for v in value):
+            return None
+        if nullable:
+            return lambda x: x is None or (isinstance(x, str) and x in strings)
+        return lambda x: isinstance(x, str) and x in strings
+
+    def _const(self, value, schema):
+        return self._enum([value], schema)
+
+    def _format(self, value, schema):
+        # Formats are annotations unless the validator checks them
+        return _always if self.validator.format_checker is None else None
+
+    def _required(self, value, schema):
+        if not isinstance(value, list):
+            return None
+        keys = tuple(value)
+        return _for_type(dict, lambda x: all(dict.__contains__(x, key) for key in keys))
+
+    def _minProperties(self, value, schema):
+        return _for_type(dict, lambda x: len(x) >= value)
+
+    def _maxProperties(self, value, schema):
+        return _for_type(dict, lambda x: len(x) <= value)
+
+    def _properties(self, value, schema):
+        checks = tuple((key, self.compile(sub)) for key, sub in value.items())
+
+        def check(x):
+            for key, valid in checks:
+                if dict.__contains__(x, key) and not valid(dict.__getitem__(x, key)):
+                    return False
+            return True
+
+        return _for_type(dict, check)
+
+    def _patternProperties(self, value, schema):
+        checks = tuple(
+            (re.compile(pattern), self.compile(sub)) for pattern, sub in value.items()
+        )
+
+        def check(x):
+            for key, item in dict.items(x):
+                for pattern, valid in checks:
+                    if pattern.search(key) and not valid(item):
+                        return False
+            return True
+
+        return _for_type(dict, check)
+
+    def _additionalProperties(self, value, schema):
+        known = frozenset(schema.get("properties", {}))
+        patterns = tuple(re.compile(p) for p in schema.get("patternProperties", {}))
+        extra = self.compile(value)
+        if extra is _always:
+            return _always
+
+        def check(x):
+            for key in dict.__iter__(x):
+                if key in known or any(p.search(key) for p in patterns):
+                    continue
+                if not extra(dict.__getitem__(x, key)):
+                    return False
+            return True
+
+        return _for_type(dict, check)
+
+    def _items(self, value, schema):
+        if not isinstance(value, (dict, bool)) or "prefixItems" in schema:
+            return None
+        item = self.compile(value)
+        return _for_type(list, lambda x: all(item(i) for i in list.__iter__(x)))
+
+    def _minItems(self, value, schema):
+        return _for_type(list, lambda x: len(x) >= value)
+
+    def _maxItems(self, value, schema):
+        return _for_type(list, lambda x: len(x) <= value)
+
+    def _minLength(self, value, schema):
+        return _for_type(str, lambda x: len(x) >= value)
+
+    def _maxLength(self, value, schema):
+        return _for_type(str, lambda x: len(x) <= value)
+
+    def _pattern(self, value, schema):
+        search = re.compile(value).search
+        return _for_type(str, lambda x: search(x) is not None)
+
+    def _minimum(self, value, schema):
+        # Draft 4 spells an exclusive limit as a boolean beside it
+        if isinstance(schema.get("exclusiveMinimum"), bool):
+            return None
+        return _for_number(value, lambda x: x >= value)
+
+    def _maximum(self, value, schema):
+        if isinstance(schema.get("exclusiveMaximum"), bool):
+            return None
+        return _for_number(value, lambda x: x <= value)
+
+    def _exclusiveMinimum(self, value, schema):
+        return _for_number(value, lambda x: x > value)
+
+    def _exclusiveMaximum(self, value, schema):
+        return _for_number(value, lambda x: x < value)
+
+
+def _all(checks):
+    if not checks:
+        return _always
+    if len(checks) == 1:
+        return checks[0]
+    checks = tuple(checks)
+
+    def check(x):
+        for valid in checks:
+            if not valid(x):
+                return False
+        return True
+
+    return check
+
+
+def _for_type(cls, check):
+    """Apply check only to instances of cls, as keywords do"""
+    return lambda x: not isinstance(x, cls) or check(x)
+
+
+def _for_number(limit, check):
+    if not _is_number(limit):
+        return None
+    return lambda x: not _is_number(x) or check(x)
+
+
+def _is_number(x):
+    return isinstance(x, numbers.Number) and not isinstance(x, bool)
+
+
+def _is_int(x):
+    return isinstance(x, int) and not isinstance(x, bool)
+
+
+def _is_integral(x):
+    if isinstance(x, bool):
+        return False
+    if isinstance(x, int):
+        return True
+    return isinstance(x, float) and x.is_integer()
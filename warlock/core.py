@@ -14,80 +14,340 @@
 
 """Core Warlock functionality"""
 
+import collections
 import copy
+import re
+import threading
 
-from jsonschema.validators import validator_for
+from . import instrumentation
+from .incremental import ANNOTATIONS, PropertyValidator
 
-from . import model
+# Array keywords that constrain each item on its own, so that items can be
+# nested models validating only the items subschema
+_NESTED_ARRAY_KEYWORDS = ANNOTATIONS | set(["type", "items", "minItems", "maxItems"])
 
+# Model options that model_factory sets on the generated class and its
+# nested child classes
+_OPTIONS = (
+    "incremental_validation",
+    "copy_on_read",
+    "lazy_validation",
+    "collect_errors",
+    "async_executor",
+    "async_threshold",
+)
 
-def model_factory(schema, base_class=model.Model, name=None, resolver=None):
+CacheInfo = collections.namedtuple("CacheInfo", "hits misses maxsize currsize")
+
+
+class ModelCache:
+    """Bounded, thread-safe LRU cache of classes built by model_factory
+
+    Classes are keyed by a canonical hash of the schema along with the other
+    model_factory arguments, so identical schemas share one class. Cached
+    classes are handed to every caller asking for them, so their attributes
+    must not be changed: options go through model_factory's arguments.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._classes = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def info(self):
+        """Return hit and miss statistics for the cache"""
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._classes))
+
+    def clear(self):
+        """Drop every cached class and reset the statistics"""
+        with self._lock:
+            self._classes.clear()
+            self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            cls = self._classes.get(key)
+            if cls is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._classes.move_to_end(key)
+            return cls
+
+    def put(self, key, cls):
+        """Store cls, or return the class another thread stored first"""
+        with self._lock:
+            if key in self._classes:
+                return self._classes[key]
+            self._classes[key] = cls
+            if len(self._classes) > self.maxsize:
+                self._classes.popitem(last=False)
+            return cls
+
+    @staticmethod
+    def key(schema, *args):
+        import hashlib
+        import json
+
+        canonical = json.dumps(
+            schema, sort_keys=True, separators=(",", ":"), default=repr
+        )
+        digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        return (digest,) + args
+
+
+def model_factory(
+    schema,
+    base_class=None,
+    name=None,
+    resolver=None,
+    cache=None,
+    nested=False,
+    compiled=False,
+    registry=None,
+    **options,
+):
     """Generate a model class based on the provided JSON Schema
 
     :param schema: dict representing valid JSON schema
+    :param base_class: Class to derive the model from, by default
+        warlock.model.Model
     :param name: A name to give the class, if `name` is not in `schema`
+    :param cache: A ModelCache to look the class up in, and store it in
+    :param nested: Wrap nested object and array properties in child models
+        that validate their own subschema and track their own changes
+    :param compiled: Compile the schema into specialized validation
+        functions, leaving keywords that can't be compiled to jsonschema
+    :param registry: A warlock.registry.SchemaRegistry, or a
+        referencing.Registry, holding the documents that $refs point to
+    :param options: Values for the Model options incremental_validation,
+        copy_on_read, lazy_validation, collect_errors, async_executor and
+        async_threshold, set on the class and its nested child classes
     """
+    # jsonschema is only imported, through the model module, once the first
+    # class is built, which keeps `import warlock` cheap
+    from . import model
+    from .registry import SchemaRegistry
+
+    if base_class is None:
+        base_class = model.Model
+    if isinstance(registry, SchemaRegistry):
+        registry = registry.registry
+
+    if cache is not None:
+        return _cached(
+            cache,
+            schema,
+            base_class,
+            name,
+            resolver,
+            nested,
+            compiled,
+            registry,
+            options,
+        )
+
+    start = instrumentation.enabled and instrumentation.clock()
     schema = copy.deepcopy(schema)
     resolver = resolver
 
+    # The validator is immutable once built, so every instance of the
+    # generated class shares it rather than building its own.
+    validator_instance = _validator(schema, resolver, registry)
+
     class Model(base_class):
-        def _setnested(self, path: list[str], value, root=None):
-            if root is None:
-                root = self
-            if len(path) > 1:
-                head = path[0]
-                if not head in root:
-                    root[head] = {}
-                self._setnested(path[1:], value, root=root[head])
-            elif len(path) == 1:
-                root[path[0]] = value
-
-        def _pathexists(self, path: list[str], root=None):
-            if root is None:
-                root = self
-            if len(path) == 1:
-                return path[0] in root
-            elif len(path) == 0:
-                return False
-            else:
-                head = path[0]
-                if head in root:
-                    return self._pathexists(path[1:], root=root[head])
-                else:
-                    return False
-
-        def _setdefaults(self, path: list[str], schema_props: dict):
-            for name, prop in schema_props.items():
-                if "type" in prop:
-                    local_path = path.copy()
-                    local_path.append(name)
-                    if prop["type"] == "object":
-                        if "properties" in prop:
-                            self._setdefaults(local_path, prop["properties"])
-                    elif "default" in prop and not name in self:
-                        if not self._pathexists(local_path):
-                            self._setnested(local_path, prop["default"])
-
-        def __init__(self, *args, **kwargs):
-            self.__dict__["schema"] = schema
-            self.__dict__["resolver"] = resolver
-
-            cls = validator_for(self.schema)
-            if resolver is not None:
-                self.__dict__["validator_instance"] = cls(schema, resolver=resolver)
-            else:
-                self.__dict__["validator_instance"] = cls(schema)
+        pass
 
-            base_class.__init__(self, *args, **kwargs)
+    Model.schema = schema
+    Model.resolver = resolver
+    Model.registry = registry
+    Model.validator_instance = validator_instance
+    Model._defaults = _compile_defaults(schema)
+    _configure(Model, options)
+    if compiled:
+        from . import compiler
 
-            if "properties" in schema:
-                self._setdefaults([], schema["properties"])
+        Model._compiled = compiler.compile_validator(validator_instance)
 
     if resolver is not None:
-        Model.resolver = resolver
+        # RefResolver keeps a mutable scope stack while resolving, so
+        # validations against it must not interleave across threads.
+        Model._validator_lock = threading.RLock()
 
     if name is not None:
         Model.__name__ = name
     elif "name" in schema:
         Model.__name__ = str(schema["name"])
+
+    if nested:
+        _nest(Model, schema, base_class, {id(schema): Model}, options)
+    if start:
+        instrumentation.record(instrumentation.FACTORY, Model, start)
     return Model
+
+
+def _cached(
+    cache, schema, base_class, name, resolver, nested, compiled, registry, options
+):
+    # The resolver and registry are kept alive by the cached class, so their
+    # ids are stable
+    key = cache.key(
+        schema,
+        base_class,
+        name,
+        id(resolver),
+        nested,
+        compiled,
+        id(registry),
+        tuple(sorted(options.items())),
+    )
+    cls = cache.get(key)
+    if cls is None:
+        cls = model_factory(
+            schema,
+            base_class,
+            name,
+            resolver,
+            nested=nested,
+            compiled=compiled,
+            registry=registry,
+            **options,
+        )
+        cls = cache.put(key, cls)
+    return cls
+
+
+def _validator(schema, resolver, registry):
+    from jsonschema.validators import validator_for
+
+    cls = validator_for(schema)
+    if resolver is not None:
+        return cls(schema, resolver=resolver)
+    if registry is not None:
+        return cls(schema, registry=registry)
+    return cls(schema)
+
+
+def _configure(cls, options):
+    unknown = sorted(set(options) - set(_OPTIONS))
+    if unknown:
+        raise TypeError("Unknown model options: %s" % ", ".join(unknown))
+    for option, value in options.items():
+        setattr(cls, option, value)
+
+
+def _nest(cls, root, base_class, built, options):
+    """Map the object and array properties of a model class to child classes
+
+    Only properties whose value is constrained by their own subschema alone
+    are nested, so a child can validate its writes without its parent.
+    """
+    cls._nested = {}
+    if PropertyValidator.build(cls.validator_instance) is None:
+        return
+    schema = cls.validator_instance.schema
+    patterns = [re.compile(pattern) for pattern in schema.get("patternProperties", {})]
+    for key, prop in schema.get("properties", {}).items():
+        if any(pattern.search(key) for pattern in patterns):
+            continue
+        child_class = _child_class(cls, root, prop, key, base_class, built, options)
+        if child_class is not None:
+            cls._nested[key] = child_class
+
+
+def _child_class(parent, root, schema, name, base_class, built, options):
+    from . import compiler, model
+
+    if isinstance(schema, dict) and list(schema) == ["$ref"]:
+        schema, _ = _resolve_local(root, schema, frozenset())
+    if not isinstance(schema, dict) or schema.get("type") not in ("object", "array"):
+        return None
+    if id(schema) in built:
+        return built[id(schema)]
+
+    if schema["type"] == "object":
+
+        class Child(base_class):
+            pass
+
+        Child.__name__ = str(schema.get("name", name))
+        Child.schema = schema
+        _configure(Child, options)
+    else:
+        if not set(schema) <= _NESTED_ARRAY_KEYWORDS:
+            return None
+
+        class Child(model.ModelList):
+            pass
+
+        Child.__name__ = "%sList" % name
+
+    Child.resolver = parent.resolver
+    Child.registry = parent.registry
+    Child.validator_instance = parent.validator_instance.evolve(schema=schema)
+    Child._validator_lock = parent._validator_lock
+    if parent._compiled is not None:
+        Child._compiled = compiler.compile_validator(Child.validator_instance)
+    built[id(schema)] = Child
+
+    if schema["type"] == "object":
+        _nest(Child, root, base_class, built, options)
+    elif isinstance(schema.get("items"), dict):
+        Child.item_class = _child_class(
+            Child, root, schema["items"], name, base_class, built, options
+        )
+    return Child
+
+
+def _compile_defaults(schema):
+    """Flatten the defaults declared in a schema's properties
+
+    Returns a list of (path, default) pairs, following allOf and local
+    references, so that instances can fill defaults without walking the
+    schema.
+    """
+    plan = []
+    _collect_defaults(schema, schema, (), plan, frozenset(["#"]))
+    return plan
+
+
+def _collect_defaults(root, schema, path, plan, refs):
+    schema, refs = _resolve_local(root, schema, refs)
+    for subschema in schema.get("allOf", []):
+        _collect_defaults(root, subschema, path, plan, refs)
+
+    for name, prop in schema.get("properties", {}).items():
+        prop, prop_refs = _resolve_local(root, prop, refs)
+        if "type" not in prop:
+            continue
+        if prop["type"] == "object":
+            _collect_defaults(root, prop, path + (name,), plan, prop_refs)
+        elif "default" in prop:
+            plan.append((path + (name,), prop["default"]))
+
+
+def _resolve_local(root, schema, refs):
+    """Follow local $refs, stopping at remote or recursive references"""
+    import urllib.parse
+
+    while isinstance(schema, dict) and isinstance(schema.get("$ref"), str):
+        ref = schema["$ref"]
+        if not ref.startswith("#") or ref in refs:
+            break
+        refs = refs | {ref}
+        target = root
+        for part in ref[1:].split("/")[1:]:
+            part = urllib.parse.unquote(part).replace("~1", "/").replace("~0", "~")
+            if isinstance(target, list) and part.isdigit():
+                part = int(part)
+            try:
+                target = target[part]
+            except (KeyError, IndexError, TypeError):
+                return {}, refs
+        schema = target
+    if not isinstance(schema, dict):
+        return {}, refs
+    return schema, refs
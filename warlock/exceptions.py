@@ -14,10 +14,88 @@
 
 """List of errors used in warlock"""
 
+import itertools
+
 
 class InvalidOperation(RuntimeError):
-    pass
+    """Raised for an operation a model refuses
+
+    `errors` lists an ErrorDetail for every error found in the document a
+    write would have produced, when it was rejected by a model class with
+    collect_errors set, and is None otherwise.
+    """
+
+    errors = None
 
 
 class ValidationError(ValueError):
     pass
+
+
+class BatchValidationError(ValidationError):
+    """Raised when records in a batch fail validation
+
+    `errors` maps the index of each invalid record to its ValidationError.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        summary = [
+            "[%d] %s" % (index, str(exc).split("\n")[0])
+            for index, exc in itertools.islice(errors.items(), 3)
+        ]
+        if len(errors) > len(summary):
+            summary.append("...")
+        msg = "%d record(s) failed validation: %s" % (len(errors), ", ".join(summary))
+        super().__init__(msg)
+
+
+class DetailedValidationError(ValidationError):
+    """Raised for an invalid object by model classes with collect_errors set
+
+    `errors` lists an ErrorDetail for every error found in the object, in
+    the order the schema was checked. The message summarizing them is only
+    built when the exception is converted to a string.
+    """
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+    def __str__(self):
+        return "%d validation error(s): %s" % (
+            len(self.errors),
+            "; ".join(str(error) for error in self.errors),
+        )
+
+
+class ErrorDetail:
+    """One error found by a DetailedValidationError
+
+    `path` is the JSON Pointer to the offending value, built on access from
+    the keys and indices in `parts`, `keyword` the schema keyword it failed,
+    and `message` jsonschema's description of the error.
+    """
+
+    __slots__ = ("parts", "keyword", "message")
+
+    def __init__(self, parts, keyword, message):
+        self.parts = tuple(parts)
+        self.keyword = keyword
+        self.message = message
+
+    @property
+    def path(self):
+        return "".join(
+            "/" + str(part).replace("~", "~0").replace("/", "~1") for part in self.parts
+        )
+
+    def __str__(self):
+        return "%s: %s" % (self.path or "(root)", self.message)
+
+    def __repr__(self):
+        return "ErrorDetail(path=%r, keyword=%r, message=%r)" % (
+            self.path,
+            self.keyword,
+            self.message,
+        )
@@ -0,0 +1,135 @@
+# Copyright 2012 Brian Waldon
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation of individual properties against an object schema"""
+
+import re
+
+# Top-level keywords whose outcome depends only on the set of keys present
+# or on a single property value. A schema using anything else has to be
+# validated as a whole document.
+KEY_KEYWORDS = frozenset(
+    [
+        "required",
+        "minProperties",
+        "maxProperties",
+        "dependencies",
+        "dependentRequired",
+        "propertyNames",
+        "additionalProperties",
+    ]
+)
+VALUE_KEYWORDS = frozenset(["properties", "patternProperties", "additionalProperties"])
+ANNOTATIONS = frozenset(
+    [
+        "$schema",
+        "$id",
+        "id",
+        "$comment",
+        "$defs",
+        "definitions",
+        "name",
+        "title",
+        "description",
+        "default",
+        "examples",
+        "readOnly",
+        "writeOnly",
+        "deprecated",
+    ]
+)
+
+
+class PropertyValidator:
+    """Validate writes to one property of an otherwise valid document
+
+    Each property value is checked against the subschemas that apply to its
+    key, and the remaining object-level keywords are checked against the
+    document's keys alone.
+    """
+
+    def __init__(self, validator):
+        schema = validator.schema
+        self.properties = dict(
+            (key, validator.evolve(schema=subschema))
+            for key, subschema in schema.get("properties", {}).items()
+        )
+        self.patterns = [
+            (re.compile(pattern), validator.evolve(schema=subschema))
+            for pattern, subschema in schema.get("patternProperties", {}).items()
+        ]
+        additional = schema.get("additionalProperties", True)
+        if isinstance(additional, dict):
+            self.additional = validator.evolve(schema=additional)
+        else:
+            self.additional = None
+
+        shape = dict(
+            (keyword, value)
+            for keyword, value in schema.items()
+            if keyword in KEY_KEYWORDS or keyword in ("$schema", "type")
+        )
+        if additional is False:
+            shape["properties"] = dict.fromkeys(self.properties, {})
+            if self.patterns:
+                shape["patternProperties"] = dict.fromkeys(
+                    schema["patternProperties"], {}
+                )
+        else:
+            shape.pop("additionalProperties", None)
+        if set(shape) - set(["$schema", "type"]):
+            self.shape = validator.evolve(schema=shape)
+        else:
+            self.shape = None
+
+    @classmethod
+    def build(cls, validator):
+        """Return a PropertyValidator, or None if the schema needs the
+        whole document to be validated"""
+        schema = validator.schema
+        if not isinstance(schema, dict) or "draft-03" in schema.get("$schema", ""):
+            return None
+        for keyword, value in schema.items():
+            if keyword in ANNOTATIONS or keyword in VALUE_KEYWORDS:
+                continue
+            if keyword == "dependencies":
+                # Schema dependencies constrain other property values
+                if not all(isinstance(v, list) for v in value.values()):
+                    return None
+            elif keyword == "type":
+                if "object" not in ([value] if isinstance(value, str) else value):
+                    return None
+            elif keyword not in KEY_KEYWORDS:
+                return None
+        return cls(validator)
+
+    def validate_value(self, key, value):
+        """Raise jsonschema.ValidationError if value is invalid for key"""
+        matched = False
+        if key in self.properties:
+            self.properties[key].validate(value)
+            matched = True
+        if isinstance(key, str):
+            for pattern, validator in self.patterns:
+                if pattern.search(key):
+                    validator.validate(value)
+                    matched = True
+        if not matched and self.additional is not None:
+            self.additional.validate(value)
+
+    def validate_keys(self, keys):
+        """Raise jsonschema.ValidationError if a document with these keys
+        breaks an object-level keyword"""
+        if self.shape is not None:
+            self.shape.validate(dict.fromkeys(keys))
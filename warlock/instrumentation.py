@@ -0,0 +1,134 @@
+# Copyright 2012 Brian Waldon
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Counters and timings of model operations, per model class
+
+Instrumentation is off by default. Once enabled, every operation listed in
+EVENTS is timed and recorded in a Histogram for the model class it ran on,
+and passed to each subscribed callback as (event, cls, seconds):
+
+    >>> warlock.instrumentation.enable()
+    >>> warlock.instrumentation.subscribe(my_metrics_exporter)
+    >>> warlock.instrumentation.stats(Country)["validate"].count
+
+While disabled, the only cost to a model is checking `enabled`.
+"""
+
+import bisect
+import threading
+import time
+import weakref
+
+FACTORY = "factory"
+CONSTRUCT = "construct"
+VALIDATE = "validate"
+VALIDATION_FAILURE = "validation_failure"
+COPY = "copy"
+PATCH = "patch"
+EVENTS = (FACTORY, CONSTRUCT, VALIDATE, VALIDATION_FAILURE, COPY, PATCH)
+
+# Upper bounds, in seconds, of the histogram buckets. A final bucket
+# counts everything slower.
+BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)
+
+enabled = False
+clock = time.perf_counter
+
+_callbacks = []
+_stats = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+class Histogram:
+    """Count, total and distribution of the durations of one event"""
+
+    __slots__ = ("count", "total", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def copy(self):
+        other = Histogram()
+        other.count = self.count
+        other.total = self.total
+        other.buckets = list(self.buckets)
+        return other
+
+    def __repr__(self):
+        return "Histogram(count=%d, total=%.6f)" % (self.count, self.total)
+
+
+def enable():
+    """Start recording model operations"""
+    global enabled
+    enabled = True
+
+
+def disable():
+    """Stop recording model operations, keeping what was recorded"""
+    global enabled
+    enabled = False
+
+
+def subscribe(callback):
+    """Call callback(event, cls, seconds) for every recorded operation"""
+    with _lock:
+        _callbacks.append(callback)
+    return callback
+
+
+def unsubscribe(callback):
+    with _lock:
+        _callbacks.remove(callback)
+
+
+def stats(cls):
+    """Return a snapshot of the histograms recorded for a model class,
+    keyed by event"""
+    with _lock:
+        histograms = _stats.get(cls, {})
+        return dict((event, h.copy()) for event, h in histograms.items())
+
+
+def reset():
+    """Forget everything recorded so far"""
+    with _lock:
+        _stats.clear()
+
+
+def record(event, cls, start):
+    """Record an event on cls that began at start, a reading of clock()"""
+    seconds = clock() - start
+    with _lock:
+        histograms = _stats.get(cls)
+        if histograms is None:
+            histograms = _stats[cls] = {}
+        histogram = histograms.get(event)
+        if histogram is None:
+            histogram = histograms[event] = Histogram()
+        histogram.observe(seconds)
+        callbacks = list(_callbacks)
+    for callback in callbacks:
+        callback(event, cls, seconds)
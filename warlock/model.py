@@ -14,52 +14,342 @@
 
 """Self-validating model for arbitrary objects"""
 
+import contextlib
 import copy
+import functools
+import itertools
+import json
 import warnings
 
-import jsonpatch
 import jsonschema
 
-from . import exceptions
+from . import exceptions, instrumentation, serialization, views
+from .incremental import PropertyValidator
+
+_MISSING = object()
+
+# Immutable types of the values JSON decodes to
+_ATOMS = frozenset([str, int, float, bool, type(None)])
 
 
 class Model(dict):
+    # Per-instance bookkeeping lives in slots rather than in the instance
+    # dict, and the change records are only allocated on first write
+    __slots__ = (
+        "_changes",
+        "_original",
+        "_parent",
+        "_key",
+        "_batch",
+        "_unvalidated",
+    )
+
+    # Populated on the classes generated by warlock.model_factory
+    schema = None
+    resolver = None
+    registry = None
+    validator_instance = None
+    _validator_lock = contextlib.nullcontext()
+    _defaults = ()
+
+    # Predicate compiled from the schema, when built with
+    # model_factory(compiled=True)
+    _compiled = None
+
+    # Child model classes for nested properties, when built with
+    # model_factory(nested=True)
+    _nested = None
+
+    # Validate writes against the affected property's subschema only, when
+    # the schema allows it, rather than revalidating the whole document
+    incremental_validation = False
+
+    # Return deep copies from items() and values() instead of read-only views
+    copy_on_read = False
+
+    # Build instances without validating them, as with Model.trusted()
+    lazy_validation = False
+
+    # Executor that acreate() and avalidate() validate documents of more
+    # than async_threshold values in, off the event loop. None is the
+    # loop's default thread pool.
+    async_executor = None
+    async_threshold = 1000
+
+    # Report every error in an invalid document, in a
+    # DetailedValidationError, rather than the first one as a message
+    collect_errors = False
+
     def __init__(self, *args, **kwargs):
         # we overload setattr so set this manually
+        self._construct(views.thaw(dict(*args, **kwargs)))
+
+    def _construct(self, d):
+        """Initialise the model from a dict it takes ownership of"""
+        start = instrumentation.enabled and instrumentation.clock()
+        originals = _merge_defaults(self._defaults, d)
+
+        if not self.lazy_validation:
+            try:
+                self.validate(d)
+            except exceptions.DetailedValidationError:
+                raise
+            except exceptions.ValidationError as exc:
+                raise ValueError(str(exc))
+
+        self._populate(d, originals)
+        _set(self, "_unvalidated", self.lazy_validation)
+        if start:
+            instrumentation.record(instrumentation.CONSTRUCT, type(self), start)
+
+    def _populate(self, d, originals=None, parent=None, key=None):
+        """Initialise the model from an already validated dict
+
+        originals holds the input values of any properties that defaults
+        were filled into, so that they show up in the patch. parent and key
+        locate a nested model within the model holding it.
+        """
+        dict.__init__(self, d)
+        _set(self, "_parent", parent)
+        _set(self, "_key", key)
+        _set(self, "_batch", None)
+        _set(self, "_unvalidated", False)
+        if self._nested:
+            for key, child_class in self._nested.items():
+                if dict.__contains__(self, key):
+                    child = child_class._adopt(dict.__getitem__(self, key), self, key)
+                    dict.__setitem__(self, key, child)
+
+        if originals:
+            _set(self, "_changes", dict((path[0], d[path[0]]) for path in originals))
+        else:
+            _set(self, "_changes", None)
+        # Original values at the paths that have been written since
+        # construction. Everything else is still as it was, so nothing needs
+        # to be copied up front.
+        _set(self, "_original", originals or None)
+
+    @classmethod
+    def _adopt(cls, value, parent, key):
+        """Wrap a validated dict as a child of parent stored under key"""
+        if not isinstance(value, dict):
+            return value
+        child = cls.__new__(cls)
+        child._populate(dict(value), parent=parent, key=key)
+        return child
+
+    @classmethod
+    def trusted(cls, *args, **kwargs):
+        """Build a model from data known to be valid, without validating it
+
+        Defaults are filled in as usual. The document is validated as a
+        whole before the first write to it, or by calling validate() with no
+        arguments, so reading from a trusted model costs no validation.
+        """
+        start = instrumentation.enabled and instrumentation.clock()
+        model = cls.__new__(cls)
         d = dict(*args, **kwargs)
+        model._populate(d, _merge_defaults(cls._defaults, d))
+        _set(model, "_unvalidated", True)
+        if start:
+            instrumentation.record(instrumentation.CONSTRUCT, cls, start)
+        return model
 
-        try:
-            self.validate(d)
-        except exceptions.ValidationError as exc:
-            raise ValueError(str(exc))
+    @classmethod
+    def from_many(cls, records, executor=None, chunksize=1000):
+        """Build a model for each record in a sequence
+
+        Every record is validated before any model is built, and all of the
+        failures are reported together in a BatchValidationError keyed by the
+        index of the offending record. Passing a concurrent.futures.Executor
+        spreads validation across its workers, chunksize records at a time.
+        Classes with lazy_validation set build trusted models instead.
+        """
+        records = [dict(record) for record in records]
+        originals = [_merge_defaults(cls._defaults, record) for record in records]
+
+        if not cls.lazy_validation:
+            errors = cls._validate_many(records, executor, chunksize)
+            if errors:
+                raise exceptions.BatchValidationError(errors)
+
+        # Each construction is timed without the validation, which covers
+        # every record at once and is recorded on its own
+        models = []
+        for record, record_originals in zip(records, originals):
+            start = instrumentation.enabled and instrumentation.clock()
+            model = cls.__new__(cls)
+            model._populate(record, record_originals)
+            _set(model, "_unvalidated", cls.lazy_validation)
+            models.append(model)
+            if start:
+                instrumentation.record(instrumentation.CONSTRUCT, cls, start)
+        return models
+
+    @classmethod
+    def from_json(cls, data):
+        """Parse a JSON object and build a model from it
+
+        data is a str or bytes-like object, or a file object to read one
+        from. The parsed object is validated and wrapped as it is, without
+        being copied.
+        """
+        if hasattr(data, "read"):
+            data = data.read()
+        d = serialization.loads(data)
+        if not isinstance(d, dict):
+            raise ValueError("%r is not of type 'object'" % (d,))
+        model = cls.__new__(cls)
+        model._construct(d)
+        return model
+
+    def to_json(self, fp=None):
+        """Serialize the model as a JSON str, or write it to a text file
+        object fp
+
+        The model's own data is encoded, without a deep copy, using orjson
+        if it is installed.
+        """
+        if fp is None:
+            return self.to_bytes().decode("utf-8")
+        serialization.dump(self, fp)
+
+    def to_bytes(self, fp=None):
+        """Serialize the model as UTF-8 encoded JSON bytes, or write them to
+        a binary file object or buffer fp"""
+        if fp is None:
+            return serialization.dumps(self)
+        serialization.dump(self, fp, binary=True)
+
+    @classmethod
+    def _validate_many(cls, records, executor, chunksize):
+        """Validate records, returning the failures keyed by index"""
+        if executor is None:
+            return dict(cls._validate_chunk(records))
+
+        offsets = range(0, len(records), chunksize)
+        chunks = (records[offset : offset + chunksize] for offset in offsets)
+        if _in_process(executor):
+            # Threads share this class's validator and compiled predicate
+            results = executor.map(cls._validate_chunk, chunks)
         else:
-            dict.__init__(self, d)
+            results = executor.map(
+                _validate_records,
+                itertools.repeat(cls._worker_schema()),
+                chunks,
+                itertools.repeat(cls.collect_errors),
+                itertools.repeat(cls._compiled is not None),
+            )
+        errors = {}
+        for offset, failures in zip(offsets, results):
+            for index, failure in failures:
+                errors[offset + index] = _failure(failure)
+        return errors
+
+    @classmethod
+    def _validate_chunk(cls, records):
+        """Validate records, returning (index, exception) pairs for the ones
+        that fail"""
+        failures = []
+        for index, record in enumerate(records):
+            try:
+                cls._validate(record)
+            except exceptions.ValidationError as exc:
+                failures.append((index, exc))
+        return failures
+
+    @classmethod
+    def _worker_schema(cls):
+        """Return the schema as JSON for validation in another process"""
+        if cls.resolver is not None or cls.registry is not None:
+            raise exceptions.InvalidOperation(
+                "Models built with a resolver or registry cannot be validated "
+                "in another process"
+            )
+        return json.dumps(cls.schema, sort_keys=True)
+
+    @classmethod
+    def iter_load(cls, source, on_error="raise", chunksize=65536):
+        """Build a model for each record in a JSON document, one at a time
 
-        self.__dict__["changes"] = {}
-        self.__dict__["__original__"] = copy.deepcopy(d)
+        source is a file object or bytes-like buffer holding either a JSON
+        array of records or newline-delimited JSON. Records are decoded and
+        validated as they are read, so memory use stays flat however large
+        the input is. on_error decides what happens to an invalid record,
+        including a malformed line of newline-delimited JSON: "raise" stops
+        at it, "skip" drops it, and "collect" drops it but raises a
+        BatchValidationError for all of them once the input is exhausted.
+        A malformed array raises json.JSONDecodeError.
+        """
+        if on_error not in ("raise", "skip", "collect"):
+            raise ValueError("on_error must be 'raise', 'skip' or 'collect'")
+        from . import stream
+
+        errors = {}
+        for index, record in enumerate(stream.iter_json(source, chunksize)):
+            try:
+                model = cls._load(record)
+            except exceptions.ValidationError as exc:
+                if on_error == "raise":
+                    raise exceptions.BatchValidationError({index: exc})
+                if on_error == "collect":
+                    errors[index] = exc
+                continue
+            yield model
+
+        if errors:
+            raise exceptions.BatchValidationError(errors)
+
+    @classmethod
+    def _load(cls, record):
+        """Build a model from a record decoded by iter_load()"""
+        start = instrumentation.enabled and instrumentation.clock()
+        if isinstance(record, json.JSONDecodeError):
+            raise exceptions.ValidationError("Malformed JSON: %s" % record)
+        if not isinstance(record, dict):
+            raise exceptions.ValidationError("%r is not of type 'object'" % (record,))
+        originals = _merge_defaults(cls._defaults, record)
+        cls._validate(record)
+
+        model = cls.__new__(cls)
+        model._populate(record, originals)
+        if start:
+            instrumentation.record(instrumentation.CONSTRUCT, cls, start)
+        return model
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if self._batch is not None and isinstance(value, (dict, list)):
+            if not _is_child(value, self):
+                # Keep what it holds now, in case it is changed in place
+                self._snapshot(key, write=False)
+        return value
 
     def __setitem__(self, key, value):
-        mutation = dict(self.items())
-        mutation[key] = value
         try:
-            self.validate(mutation)
+            self._validate_mutation({key: value})
         except exceptions.ValidationError as exc:
             msg = "Unable to set '%s' to %r. Reason: %s" % (key, value, str(exc))
-            raise exceptions.InvalidOperation(msg)
+            raise _rejected(msg, exc) from exc
 
-        dict.__setitem__(self, key, value)
+        self._snapshot(key)
+        dict.__setitem__(self, key, self._hydrate(key, value))
 
-        self.__dict__["changes"][key] = value
+        if self._changes is None:
+            _set(self, "_changes", {})
+        self._changes[key] = value
 
     def __delitem__(self, key):
-        mutation = dict(self.items())
-        del mutation[key]
+        if key not in self:
+            raise KeyError(key)
         try:
-            self.validate(mutation)
+            self._validate_mutation({}, deleted=(key,))
         except exceptions.ValidationError as exc:
             msg = "Unable to delete attribute '%s'. Reason: %s" % (key, str(exc))
-            raise exceptions.InvalidOperation(msg)
+            raise _rejected(msg, exc) from exc
 
+        self._snapshot(key)
+        _detach(dict.__getitem__(self, key), self)
         dict.__delitem__(self, key)
 
     def __getattr__(self, key):
@@ -74,6 +364,50 @@ class Model(dict):
     def __delattr__(self, key):
         self.__delitem__(key)
 
+    def fork(self, keep_patch=False):
+        """Return a model of the same class holding the same data
+
+        The fork holds its own copies of the nested containers, as either
+        model hands its containers out to be changed in place, but it is not
+        validated again. Its patch starts empty, unless keep_patch is set,
+        in which case it carries on from this model's.
+        """
+        start = instrumentation.enabled and instrumentation.clock()
+        model = self._fork()
+        if keep_patch:
+            if self._changes is not None:
+                _set(model, "_changes", dict(self._changes))
+            if self._original is not None:
+                _set(model, "_original", dict(self._original))
+        if start:
+            instrumentation.record(instrumentation.COPY, type(self), start)
+            instrumentation.record(instrumentation.CONSTRUCT, type(self), start)
+        return model
+
+    def _fork(self, parent=None, key=None):
+        """Build a fork of this model with copies of its containers"""
+        d = dict(self)
+        model = type(self).__new__(type(self))
+        for name, value in d.items():
+            if not isinstance(value, (dict, list)):
+                continue
+            if isinstance(value, Model) and _is_child(value, self):
+                d[name] = value._fork(model, name)
+            elif _is_child(value, self):
+                d[name] = type(value)._adopt(_copy(_plain(value)), model, name)
+            else:
+                d[name] = _copy(value)
+
+        dict.__init__(model, d)
+        _set(model, "_parent", parent)
+        _set(model, "_key", key)
+        _set(model, "_batch", None)
+        # A model in the middle of a batch may hold invalid data
+        _set(model, "_unvalidated", self._unvalidated or self._batch is not None)
+        _set(model, "_changes", None)
+        _set(model, "_original", None)
+        return model
+
     # BEGIN dict compatibility methods
 
     def clear(self):
@@ -85,49 +419,803 @@ class Model(dict):
     def popitem(self):
         raise exceptions.InvalidOperation()
 
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
     def copy(self):
-        return copy.deepcopy(dict(self))
+        return self.__deepcopy__({})
 
     def __copy__(self):
         return self.copy()
 
     def __deepcopy__(self, memo):
-        return copy.deepcopy(dict(self), memo)
+        start = instrumentation.enabled and instrumentation.clock()
+        result = copy.deepcopy(dict(self), memo)
+        if start:
+            instrumentation.record(instrumentation.COPY, type(self), start)
+        return result
 
     def update(self, other):
-        mutation = dict(self.items())
-        mutation.update(other)
+        other = dict(other)
         try:
-            self.validate(mutation)
+            self._validate_mutation(other)
         except exceptions.ValidationError as exc:
-            raise exceptions.InvalidOperation(str(exc))
-        dict.update(self, other)
+            raise _rejected(str(exc), exc) from exc
+        for key, value in other.items():
+            self._snapshot(key)
+            dict.__setitem__(self, key, self._hydrate(key, value))
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
 
     def items(self):
-        return copy.deepcopy(dict(self)).items()
+        if self.copy_on_read:
+            return self.copy().items()
+        return views.ItemsView(self)
 
     def values(self):
-        return copy.deepcopy(dict(self)).values()
+        if self.copy_on_read:
+            return self.copy().values()
+        return views.ValuesView(self)
 
     # END dict compatibility methods
 
+    def _hydrate(self, key, value):
+        """Replace the value stored under key, wrapping it as a child model
+        if the property is nested"""
+        if dict.__contains__(self, key):
+            _detach(dict.__getitem__(self, key), self)
+        if self._nested and key in self._nested:
+            return self._nested[key]._adopt(value, self, key)
+        return value
+
+    def _snapshot(self, key, write=True):
+        """Record the original value of key before it changes
+
+        write is False when a mutable value is only being handed out during
+        a batch, which keeps it to roll back to but leaves the patch alone.
+        """
+        self._touch((key,), write)
+
+    def _touch(self, path, write=True):
+        """Pass a path relative to this model up to the root model"""
+        batch = self._batch
+        if batch is not None:
+            if path[0] not in batch:
+                value = dict.get(self, path[0], _MISSING)
+                if isinstance(value, (dict, list)):
+                    value = copy.deepcopy(value)
+                batch[path[0]] = value
+        elif write and self._unvalidated:
+            # Nothing has been changed yet, so this checks the trusted data
+            try:
+                self.validate()
+            except exceptions.ValidationError as exc:
+                msg = "Unable to modify invalid model. Reason: %s" % str(exc)
+                raise _rejected(msg, exc) from exc
+        if not write:
+            return
+
+        parent = self._parent
+        if parent is None:
+            self._record(path)
+        elif isinstance(parent, ModelList):
+            parent._touch((), write)
+        else:
+            parent._touch((self._key,) + path, write)
+
+    def _record(self, path):
+        """Record the original value at path, unless it or one of its
+        ancestors has been recorded already"""
+        original = self._original
+        if original is None:
+            original = {}
+            _set(self, "_original", original)
+        for depth in range(1, len(path) + 1):
+            if path[:depth] in original:
+                return
+
+        baseline = _lookup(self, path)
+        if baseline is not _MISSING:
+            start = instrumentation.enabled and instrumentation.clock()
+            baseline = copy.deepcopy(baseline)
+            if start:
+                instrumentation.record(instrumentation.COPY, type(self), start)
+        if self._nested:
+            # Fold recorded descendants back in so the baseline is the value
+            # before any of them changed
+            for other in list(original):
+                if len(other) > len(path) and other[: len(path)] == path:
+                    _restore(baseline, other[len(path) :], original.pop(other))
+        original[path] = baseline
+
+    def _patch_operations(self):
+        """Build JSON patch operations for the properties that changed
+
+        Only the recorded properties are compared, so the cost depends on
+        what was touched rather than on the size of the document. Repeated
+        writes to a property collapse into a single operation.
+        """
+        import jsonpatch
+
+        start = instrumentation.enabled and instrumentation.clock()
+        operations = []
+        for keys, original in (self._original or {}).items():
+            path = "".join("/" + _escape(key) for key in keys)
+            value = _lookup(self, keys)
+            if value is _MISSING:
+                if original is not _MISSING:
+                    operations.append({"op": "remove", "path": path})
+                continue
+            if original is _MISSING:
+                operations.append({"op": "add", "path": path, "value": value})
+            elif original == value:
+                continue
+            elif _same_container(original, value):
+                for operation in jsonpatch.make_patch(original, value):
+                    operation["path"] = path + operation["path"]
+                    if "from" in operation:
+                        operation["from"] = path + operation["from"]
+                    operations.append(operation)
+            else:
+                operations.append({"op": "replace", "path": path, "value": value})
+        if start:
+            instrumentation.record(instrumentation.PATCH, type(self), start)
+        return operations
+
+    def apply_patch(self, patch):
+        """Apply a JSON patch to the model in place
+
+        patch is a list of operations, a JSON string of one, or a
+        jsonpatch.JsonPatch. The operations are applied to copies of just the
+        properties they change, which are validated and then swapped in
+        together, so a patch that fails part way, or would leave the model
+        invalid, changes nothing. Only the changed properties are
+        revalidated when the schema allows it. The changes are recorded in
+        patch like any other write.
+        """
+        read, written, document = self._apply_operations(patch)
+        if not isinstance(document, dict):
+            raise exceptions.InvalidOperation(
+                "Unable to apply patch. Reason: the result is not an object"
+            )
+
+        written = written | set(document) - read
+        updates = dict((key, document[key]) for key in written if key in document)
+        deleted = [key for key in written if key in self and key not in document]
+        try:
+            self._validate_mutation(updates, deleted, incremental=True)
+        except exceptions.ValidationError as exc:
+            msg = "Unable to apply patch. Reason: %s" % exc
+            raise _rejected(msg, exc) from exc
+
+        for key in deleted:
+            self._snapshot(key)
+            _detach(dict.__getitem__(self, key), self)
+            dict.__delitem__(self, key)
+        for key, value in updates.items():
+            self._snapshot(key)
+            dict.__setitem__(self, key, self._hydrate(key, value))
+            if self._changes is None:
+                _set(self, "_changes", {})
+            self._changes[key] = value
+
+    def _apply_operations(self, patch):
+        """Apply a JSON patch to a document holding the properties it reads
+        and copies of those it changes, returning the keys it only read, the
+        keys it changed and the patched document"""
+        import jsonpatch
+
+        try:
+            if isinstance(patch, str):
+                patch = jsonpatch.JsonPatch.from_string(patch)
+            elif not isinstance(patch, jsonpatch.JsonPatch):
+                patch = jsonpatch.JsonPatch(patch)
+            read, written = _patched_keys(patch.patch)
+            if None in read | written:
+                # An operation on the root may replace the whole document
+                read, written = set(), set(self)
+                document = copy.deepcopy(dict(self))
+            else:
+                document = {}
+                for key in read | written:
+                    if dict.__contains__(self, key):
+                        value = dict.__getitem__(self, key)
+                        document[key] = (
+                            copy.deepcopy(value) if key in written else value
+                        )
+            return read, written, patch.apply(document, in_place=True)
+        except (jsonpatch.JsonPatchException, jsonpatch.JsonPointerException) as exc:
+            raise exceptions.InvalidOperation("Unable to apply patch. Reason: %s" % exc)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Defer validation of writes until the end of a with block
+
+        The document is validated once, as a whole, when the block exits, so
+        that properties which are only valid together can be changed one at
+        a time. If it is invalid, or the block raises, every property of
+        this model is restored to its value before the block and
+        InvalidOperation, or the block's exception, is raised. Writes made
+        through nested child models are still validated as they happen.
+        """
+        if self._batch is not None:
+            # Join the enclosing batch
+            yield self
+            return
+
+        previous = (self._changes, self._original)
+        snapshot = tuple(None if d is None else dict(d) for d in previous)
+        _set(self, "_batch", {})
+        try:
+            yield self
+            try:
+                self.validate()
+            except exceptions.ValidationError as exc:
+                msg = "Unable to apply batch. Reason: %s" % str(exc)
+                raise _rejected(msg, exc) from exc
+        except BaseException:
+            self._rollback(self._batch, *snapshot)
+            raise
+        finally:
+            _set(self, "_batch", None)
+        _set(self, "_unvalidated", False)
+
+    def _rollback(self, values, changes, original):
+        """Restore properties to the values recorded by a batch"""
+        for key, value in values.items():
+            if dict.__contains__(self, key):
+                _detach(dict.__getitem__(self, key), self)
+                dict.__delitem__(self, key)
+            if value is not _MISSING:
+                dict.__setitem__(self, key, self._hydrate(key, value))
+        _set(self, "_changes", changes)
+        _set(self, "_original", original)
+
     @property
     def patch(self):
         """Return a jsonpatch object representing the delta"""
-        original = self.__dict__["__original__"]
-        return jsonpatch.make_patch(original, dict(self)).to_string()
+        return json.dumps(self._patch_operations())
 
     @property
     def changes(self):
         """Dumber version of 'patch' method"""
         deprecation_msg = "Model.changes will be removed in warlock v2"
         warnings.warn(deprecation_msg, DeprecationWarning, stacklevel=2)
-        return copy.deepcopy(self.__dict__["changes"])
+        return copy.deepcopy(self._changes or {})
+
+    def _validate_mutation(self, updates, deleted=(), incremental=None):
+        """Validate the document that results from applying a mutation
 
-    def validate(self, obj):
-        """Apply a JSON schema to an object"""
+        Only the changed properties are validated if incremental, which
+        defaults to the class's incremental_validation, is set and the
+        schema allows it.
+        """
+        if self._batch is not None:
+            return
+        if incremental is None:
+            incremental = self.incremental_validation
+        checker = self._property_validator() if incremental else None
+        if checker is None:
+            mutation = dict(self)
+            mutation.update(updates)
+            for key in deleted:
+                del mutation[key]
+            self.validate(mutation)
+            # The whole document has been checked, trusted or not
+            _set(self, "_unvalidated", False)
+            return
+
+        start = instrumentation.enabled and instrumentation.clock()
         try:
-            self.validator_instance.validate(obj)
+            with self._validator_lock:
+                for key, value in updates.items():
+                    checker.validate_value(key, value)
+                if deleted or any(key not in self for key in updates):
+                    keys = [key for key in self if key not in deleted]
+                    keys.extend(key for key in updates if key not in self)
+                    checker.validate_keys(keys)
 
         except jsonschema.ValidationError as exc:
+            # Validate the document the write would produce, so the error is
+            # reported as full validation reports it, rather than against
+            # the subschema or key listing that caught it
+            self._validate_mutation(updates, deleted, incremental=False)
             raise exceptions.ValidationError(str(exc))
+        _validated(type(self), start)
+
+    @classmethod
+    def _property_validator(cls):
+        if "_checker" not in cls.__dict__:
+            cls._checker = PropertyValidator.build(cls.validator_instance)
+        return cls._checker
+
+    def validate(self, obj=_MISSING):
+        """Apply a JSON schema to an object, or to this model if no object
+        is given"""
+        if obj is not _MISSING:
+            self._validate(obj)
+            return
+        self._validate(dict(self))
+        _set(self, "_unvalidated", False)
+
+    async def avalidate(self, obj=_MISSING):
+        """Coroutine version of validate(), for use on an event loop
+
+        The model must not be changed until it completes.
+        """
+        if obj is not _MISSING:
+            await self._avalidate(obj)
+            return
+        await self._avalidate(_plain(self))
+        _set(self, "_unvalidated", False)
+
+    @classmethod
+    async def acreate(cls, *args, **kwargs):
+        """Coroutine version of the constructor, for use on an event loop"""
+        model = cls.__new__(cls)
+        d = dict(*args, **kwargs)
+        if cls.lazy_validation or not _exceeds(d, cls.async_threshold):
+            model._construct(d)
+            return model
+
+        start = instrumentation.enabled and instrumentation.clock()
+        originals = _merge_defaults(cls._defaults, d)
+        try:
+            await cls._avalidate(d)
+        except exceptions.DetailedValidationError:
+            raise
+        except exceptions.ValidationError as exc:
+            raise ValueError(str(exc))
+        model._populate(d, originals)
+        if start:
+            instrumentation.record(instrumentation.CONSTRUCT, cls, start)
+        return model
+
+    @classmethod
+    async def _avalidate(cls, obj):
+        """Validate obj, in async_executor if it is large"""
+        if not _exceeds(obj, cls.async_threshold):
+            cls._validate(obj)
+            return
+
+        # Imported here rather than with the module, as only async callers,
+        # which have already imported it, need it
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        executor = cls.async_executor
+        if _in_process(executor):
+            await loop.run_in_executor(executor, cls._validate, obj)
+            return
+
+        failures = await loop.run_in_executor(
+            executor,
+            _validate_records,
+            cls._worker_schema(),
+            [obj],
+            cls.collect_errors,
+            cls._compiled is not None,
+        )
+        if failures:
+            raise _failure(failures[0][1])
+
+    @classmethod
+    def _validate(cls, obj):
+        try:
+            with cls._validator_lock:
+                _check(cls, obj)
+
+        except jsonschema.ValidationError as exc:
+            raise cls._error(exc, obj)
+
+    @classmethod
+    def _error(cls, exc, obj):
+        """Build the exception for obj failing validation with exc
+
+        Only once a document has failed is it checked again for the rest of
+        its errors, so collect_errors costs valid documents nothing.
+        """
+        if not cls.collect_errors:
+            return exceptions.ValidationError(str(exc))
+        with cls._validator_lock:
+            errors = cls.validator_instance.iter_errors(obj)
+            return exceptions.DetailedValidationError([_detail(e) for e in errors])
+
+    @classmethod
+    def warm(cls):
+        """Resolve every reference in the schema ahead of first use
+
+        Remote documents fetched through the resolver are cached on it, so
+        calling this at startup keeps the first validation from paying for
+        reference resolution.
+        """
+        if cls.resolver is None:
+            return
+        with cls._validator_lock:
+            _resolve_refs(cls.resolver, cls.schema, set())
+
+
+class ModelList(list):
+    """Array property of a nested model, validated on every mutation
+
+    Changes are reported to the containing model as a change to the whole
+    array.
+    """
+
+    # Populated on the classes generated by warlock.model_factory
+    resolver = None
+    registry = None
+    validator_instance = None
+    item_class = None
+    _validator_lock = contextlib.nullcontext()
+    _compiled = None
+    _parent = None
+    _key = None
+
+    @classmethod
+    def _adopt(cls, value, parent, key):
+        """Wrap a validated list as a child of parent stored under key"""
+        if not isinstance(value, list):
+            return value
+        child = cls()
+        child._parent = parent
+        child._key = key
+        list.extend(child, child._hydrate(value))
+        return child
+
+    def _hydrate(self, items):
+        if self.item_class is None:
+            return list(items)
+        return [self.item_class._adopt(item, self, None) for item in items]
+
+    def _touch(self, path=(), write=True):
+        parent = self._parent
+        if isinstance(parent, ModelList):
+            parent._touch((), write)
+        elif parent is not None:
+            parent._touch((self._key,), write)
+
+    def _mutate(self, method, *args, **kwargs):
+        mutation = list(self)
+        getattr(list, method)(mutation, *args, **kwargs)
+        try:
+            with self._validator_lock:
+                _check(type(self), mutation)
+        except jsonschema.ValidationError as exc:
+            msg = "Unable to modify '%s'. Reason: %s" % (self._key, str(exc))
+            raise exceptions.InvalidOperation(msg)
+
+        self._touch()
+        return getattr(list, method)(self, *args, **kwargs)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = self._hydrate(value)
+        else:
+            value = self._hydrate([value])[0]
+        self._mutate("__setitem__", index, value)
+
+    def __delitem__(self, index):
+        self._mutate("__delitem__", index)
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __imul__(self, n):
+        self._mutate("__imul__", n)
+        return self
+
+    def append(self, value):
+        self._mutate("append", self._hydrate([value])[0])
+
+    def extend(self, values):
+        self._mutate("extend", self._hydrate(values))
+
+    def insert(self, index, value):
+        self._mutate("insert", index, self._hydrate([value])[0])
+
+    def pop(self, index=-1):
+        return self._mutate("pop", index)
+
+    def remove(self, value):
+        self._mutate("remove", value)
+
+    def clear(self):
+        self._mutate("clear")
+
+    def reverse(self):
+        self._mutate("reverse")
+
+    def sort(self, *, key=None, reverse=False):
+        self._mutate("sort", key=key, reverse=reverse)
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(list(self), memo)
+
+
+def _check(cls, obj):
+    """Validate obj, trying the compiled predicate before the validator
+
+    The validator only runs for instances the predicate rejects, so the
+    errors raised are the ones it would have raised on its own.
+    """
+    start = instrumentation.enabled and instrumentation.clock()
+    compiled = cls._compiled
+    if compiled is None or not compiled(obj):
+        try:
+            cls.validator_instance.validate(obj)
+        except jsonschema.ValidationError:
+            _validated(cls, start, failed=True)
+            raise
+    _validated(cls, start)
+
+
+def _validated(cls, start, failed=False):
+    if start:
+        instrumentation.record(instrumentation.VALIDATE, cls, start)
+        if failed:
+            instrumentation.record(instrumentation.VALIDATION_FAILURE, cls, start)
+
+
+def _patched_keys(operations):
+    """Return the top-level keys that JSON patch operations only read, and
+    those they change, with None standing for the whole document"""
+    read, written = set(), set()
+    for operation in operations:
+        head = _head(operation["path"])
+        if operation["op"] == "test":
+            read.add(head)
+        else:
+            written.add(head)
+        if operation["op"] == "move":
+            written.add(_head(operation["from"]))
+        elif operation["op"] == "copy":
+            read.add(_head(operation["from"]))
+    return read - written, written
+
+
+def _head(pointer):
+    import jsonpatch
+
+    parts = jsonpatch.JsonPointer(pointer).parts
+    return parts[0] if parts else None
+
+
+def _exceeds(value, limit):
+    """Whether value holds more than limit values, counting containers"""
+    stack = [value]
+    count = 0
+    while stack:
+        count += 1
+        if count > limit:
+            return True
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(dict.values(value))
+        elif isinstance(value, list):
+            stack.extend(list.__iter__(value))
+    return False
+
+
+def _plain(value):
+    """Shallow copy models and model lists into plain dicts and lists"""
+    if isinstance(value, Model):
+        d = dict(value)
+        for key in value._nested or ():
+            if key in d:
+                d[key] = _plain(d[key])
+        return d
+    if isinstance(value, ModelList):
+        if value.item_class is None:
+            return list(value)
+        return [_plain(item) for item in value]
+    return value
+
+
+def _copy(value):
+    """Deep copy value, quickly for the dicts, lists and scalars that JSON
+    decodes to"""
+    kind = type(value)
+    if kind is dict:
+        return dict(
+            (key, item if type(item) in _ATOMS else _copy(item))
+            for key, item in value.items()
+        )
+    if kind is list:
+        return [item if type(item) in _ATOMS else _copy(item) for item in value]
+    if kind in _ATOMS:
+        return value
+    return copy.deepcopy(value)
+
+
+def _iter_refs(schema):
+    if isinstance(schema, dict):
+        ref = schema.get("$ref")
+        if isinstance(ref, str):
+            yield ref
+        for key, value in schema.items():
+            if key not in ("$ref", "enum", "const", "default"):
+                yield from _iter_refs(value)
+    elif isinstance(schema, list):
+        for item in schema:
+            yield from _iter_refs(item)
+
+
+def _resolve_refs(resolver, schema, seen):
+    for ref in _iter_refs(schema):
+        url, resolved = resolver.resolve(ref)
+        if url in seen:
+            continue
+        seen.add(url)
+        resolver.push_scope(url)
+        try:
+            _resolve_refs(resolver, resolved, seen)
+        finally:
+            resolver.pop_scope()
+
+
+def _merge_defaults(defaults, d):
+    """Fill (path, default) pairs into d where nothing is set yet
+
+    Nested dicts are copied before being written to, so the caller's input
+    is left untouched. Returns the original values of the top-level keys
+    that changed, keyed by their path.
+    """
+    originals = {}
+    owned = set()
+    for path, default in defaults:
+        if not _can_default(d, path):
+            continue
+
+        head = path[0]
+        if (head,) not in originals:
+            if head in d:
+                originals[(head,)] = copy.deepcopy(d[head])
+            else:
+                originals[(head,)] = _MISSING
+
+        node = d
+        for key in path[:-1]:
+            if dict.__contains__(node, key):
+                child = dict.__getitem__(node, key)
+                if id(child) not in owned:
+                    child = dict(child)
+            else:
+                child = {}
+            node[key] = child
+            owned.add(id(child))
+            node = child
+        node[path[-1]] = copy.deepcopy(default)
+    return originals
+
+
+def _can_default(d, path):
+    """Whether path is unset in d and not blocked by a non-object value"""
+    node = d
+    for key in path:
+        if not isinstance(node, dict):
+            return False
+        if not dict.__contains__(node, key):
+            return True
+        node = dict.__getitem__(node, key)
+    return False
+
+
+def _in_process(executor):
+    """Whether executor runs its calls in this process, as the event loop's
+    default executor and thread pools do"""
+    # Imported here rather than with the module, as only callers passing an
+    # executor, which have already imported it, need it
+    import concurrent.futures
+
+    return not isinstance(executor, concurrent.futures.ProcessPoolExecutor)
+
+
+@functools.lru_cache(maxsize=32)
+def _worker_validator(schema, compiled):
+    """Return the validator and compiled predicate, or None, for a schema
+    given as JSON, built once per worker process"""
+    schema = json.loads(schema)
+    validator = jsonschema.validators.validator_for(schema)(schema)
+    if not compiled:
+        return validator, None
+    from . import compiler
+
+    return validator, compiler.compile_validator(validator)
+
+
+def _validate_records(schema, records, collect=False, compiled=False):
+    """Validate records in a worker process, returning (index, failure)
+    pairs for the ones that fail
+
+    Each failure is the error message, or a list of ErrorDetails if collect
+    is set, for _failure() to turn back into an exception.
+    """
+    validator, predicate = _worker_validator(schema, compiled)
+    failures = []
+    for index, record in enumerate(records):
+        if predicate is not None and predicate(record):
+            continue
+        try:
+            validator.validate(record)
+        except jsonschema.ValidationError as exc:
+            if collect:
+                errors = validator.iter_errors(record)
+                failures.append((index, [_detail(error) for error in errors]))
+            else:
+                failures.append((index, str(exc)))
+    return failures
+
+
+def _rejected(msg, exc):
+    """Build the InvalidOperation for a write that failed validation with
+    exc, carrying over its errors if it is a DetailedValidationError"""
+    error = exceptions.InvalidOperation(msg)
+    error.errors = getattr(exc, "errors", None)
+    return error
+
+
+def _failure(failure):
+    if isinstance(failure, Exception):
+        return failure
+    if isinstance(failure, str):
+        return exceptions.ValidationError(failure)
+    return exceptions.DetailedValidationError(failure)
+
+
+def _detail(error):
+    return exceptions.ErrorDetail(error.absolute_path, error.validator, error.message)
+
+
+_set = object.__setattr__
+
+
+def _is_child(value, parent):
+    return isinstance(value, (Model, ModelList)) and value._parent is parent
+
+
+def _detach(value, parent):
+    if _is_child(value, parent):
+        _set(value, "_parent", None)
+
+
+def _lookup(root, path):
+    node = root
+    for key in path:
+        if not isinstance(node, dict) or not dict.__contains__(node, key):
+            return _MISSING
+        node = dict.__getitem__(node, key)
+    return node
+
+
+def _restore(baseline, path, value):
+    node = baseline
+    for key in path[:-1]:
+        node = node[key]
+    if value is _MISSING:
+        node.pop(path[-1], None)
+    else:
+        node[path[-1]] = value
+
+
+def _escape(key):
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _same_container(a, b):
+    return (isinstance(a, dict) and isinstance(b, dict)) or (
+        isinstance(a, list) and isinstance(b, list)
+    )
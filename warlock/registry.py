@@ -0,0 +1,107 @@
+# Copyright 2012 Brian Waldon
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Schema documents shared by the models that reference them"""
+
+import json
+import os
+import threading
+
+try:
+    import referencing
+    import referencing.exceptions
+    import referencing.jsonschema
+except ImportError:  # jsonschema < 4.18
+    referencing = None
+
+
+class SchemaRegistry:
+    """Thread-safe store of schema documents for resolving $refs
+
+    Documents are added once, crawled for their subschemas and anchors, and
+    then shared by every model class built with this registry, instead of
+    each validator looking them up again. It wraps the immutable
+    referencing.Registry used by jsonschema 4.18+, which model_factory is
+    given a snapshot of, so adding documents later does not affect classes
+    that have already been built.
+
+    :param retrieve: Optional callable taking a URI and returning the schema
+        document at it, for references to documents that have not been
+        added. Retrieved documents are kept for every later lookup.
+    :param default_specification: Draft assumed for documents without a
+        $schema, a referencing.Specification. Defaults to draft 2020-12.
+    """
+
+    def __init__(self, retrieve=None, default_specification=None):
+        if referencing is None:
+            raise ImportError("SchemaRegistry requires jsonschema 4.18 or later")
+        if default_specification is None:
+            default_specification = referencing.jsonschema.DRAFT202012
+        self.default_specification = default_specification
+        self._fetch = retrieve
+        self._lock = threading.Lock()
+        self._registry = referencing.Registry(retrieve=self._retrieve)
+
+    @classmethod
+    def from_directory(cls, path, **kwargs):
+        """Build a registry preloaded with the schema files in a directory"""
+        registry = cls(**kwargs)
+        registry.load_directory(path)
+        return registry
+
+    @property
+    def registry(self):
+        """The current referencing.Registry, to pass to jsonschema"""
+        with self._lock:
+            return self._registry
+
+    def add(self, uri, schema):
+        """Register a schema document under a URI, and under its own $id"""
+        resource = referencing.Resource.from_contents(
+            schema, default_specification=self.default_specification
+        )
+        resources = [(uri, resource)]
+        if resource.id() and resource.id() != uri:
+            resources.append((resource.id(), resource))
+        with self._lock:
+            self._registry = self._registry.with_resources(resources).crawl()
+
+    def load_directory(self, path):
+        """Register every .json file below path under its relative path
+
+        A file at sub/common.json is registered as "sub/common.json", which
+        is how documents without an $id refer to one another, as well as
+        under its $id if it has one.
+        """
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if not filename.endswith(".json"):
+                    continue
+                filepath = os.path.join(dirpath, filename)
+                with open(filepath) as fp:
+                    schema = json.load(fp)
+                uri = os.path.relpath(filepath, path).replace(os.sep, "/")
+                self.add(uri, schema)
+
+    def _retrieve(self, uri):
+        # Called by referencing for URIs missing from a snapshot. Documents
+        # are fetched once and added here, where any model looks for them.
+        resource = self.registry.get(uri)
+        if resource is None:
+            if self._fetch is None:
+                raise referencing.exceptions.NoSuchResource(ref=uri)
+            self.add(uri, self._fetch(uri))
+            resource = self.registry[uri]
+        return resource
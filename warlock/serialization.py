@@ -0,0 +1,62 @@
+# Copyright 2012 Brian Waldon
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""JSON encoding and decoding, using orjson when it is installed
+
+Both backends produce compact UTF-8 JSON. They differ on values JSON has no
+room for: orjson writes NaN and infinities as null where json writes NaN and
+Infinity. Integers beyond 64 bits, which orjson rejects, are handed to json.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+
+
+def dumps(obj):
+    """Return obj encoded as JSON bytes"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            pass
+    return _encoder.encode(obj).encode("utf-8")
+
+
+def dump(obj, fp, binary=False):
+    """Write obj as JSON to fp, as bytes if binary is set, else as text"""
+    if orjson is not None:
+        try:
+            data = orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            pass
+        else:
+            fp.write(data if binary else data.decode("utf-8"))
+            return
+    for chunk in _encoder.iterencode(obj):
+        fp.write(chunk.encode("utf-8") if binary else chunk)
+
+
+def loads(data):
+    """Decode JSON from a str or bytes-like object"""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
@@ -0,0 +1,165 @@
+# Copyright 2012 Brian Waldon
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Incremental decoding of JSON documents from files and buffers"""
+
+import codecs
+import json
+import re
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def iter_json(source, chunksize=65536):
+    """Yield the JSON values in source one at a time
+
+    source is a file object opened in text or binary mode, or a bytes-like
+    buffer such as an mmap. It holds either a single top-level JSON array,
+    whose items are yielded, or newline-delimited JSON with one value per
+    line. Only one value and one chunk are held in memory at a time.
+
+    A malformed line of newline-delimited JSON is yielded as the
+    json.JSONDecodeError it raised, in place of its value, so that the lines
+    after it can still be read. A malformed array raises the error.
+    """
+    buf = _Buffer(_iter_chunks(source, chunksize))
+    if buf.peek() == "[":
+        yield from _iter_array(buf)
+    else:
+        yield from _iter_lines(buf)
+
+
+def _iter_lines(buf):
+    while True:
+        line = buf.readline()
+        if line is None:
+            return
+        if _WHITESPACE.fullmatch(line):
+            continue
+        try:
+            yield buf.decoder.decode(line)
+        except json.JSONDecodeError as exc:
+            yield exc
+
+
+def _iter_array(buf):
+    buf.pos += 1
+    if buf.peek() != "]":
+        while True:
+            yield buf.decode()
+            if buf.peek() != ",":
+                break
+            buf.pos += 1
+    if buf.peek() is None:
+        raise json.JSONDecodeError("Unterminated array", buf.text, buf.pos)
+    if buf.peek() != "]":
+        raise json.JSONDecodeError("Expecting ',' delimiter", buf.text, buf.pos)
+    buf.pos += 1
+    if buf.peek() is not None:
+        raise json.JSONDecodeError("Extra data", buf.text, buf.pos)
+
+
+class _Buffer:
+    """Window over a stream of text chunks, refilled as values are read"""
+
+    decoder = json.JSONDecoder()
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+        else:
+            self.text = self.text[self.pos :] + chunk
+            self.pos = 0
+
+    def peek(self):
+        """Skip whitespace and return the next character, or None at EOF"""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if self.eof:
+                return None
+            self.fill()
+
+    def readline(self):
+        """Return the text up to the next newline, or None at EOF"""
+        start = self.pos
+        while True:
+            end = self.text.find("\n", start)
+            if end != -1:
+                line = self.text[self.pos : end]
+                self.pos = end + 1
+                return line
+            if self.eof:
+                if self.pos == len(self.text):
+                    return None
+                line = self.text[self.pos :]
+                self.pos = len(self.text)
+                return line
+            # Only search the text that fill() adds
+            searched = len(self.text) - self.pos
+            self.fill()
+            start = self.pos + searched
+
+    def decode(self):
+        """Decode the value after any whitespace"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                # A value running to the end of the text may be cut short, as
+                # with numbers, so wait for more input before trusting it
+                if end < len(self.text) or self.eof:
+                    self.pos = end
+                    return value
+            self.fill()
+
+
+def _iter_chunks(source, chunksize):
+    """Yield text chunks from a file object or bytes-like buffer"""
+    if hasattr(source, "read"):
+        read = source.read
+    else:
+        view = memoryview(source)
+        offsets = iter(range(0, len(view), chunksize))
+
+        def read(size):
+            offset = next(offsets, None)
+            if offset is None:
+                return b""
+            return view[offset : offset + size].tobytes()
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        chunk = read(chunksize)
+        if not chunk:
+            break
+        if not isinstance(chunk, str):
+            chunk = decoder.decode(chunk)
+        if chunk:
+            yield chunk
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
@@ -0,0 +1,175 @@
+# Copyright 2012 Brian Waldon
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Read-only views over model data"""
+
+import collections.abc
+import copy
+
+# Types of the values json decodes to other than containers
+_SCALARS = frozenset([str, int, float, bool, type(None)])
+
+
+def freeze(value):
+    """Wrap mutable containers in read-only views, leaving scalars and views
+    as-is"""
+    kind = type(value)
+    if kind is dict:
+        return FrozenDict(value)
+    if kind is list:
+        return FrozenList(value)
+    if kind in _SCALARS or kind is FrozenDict or kind is FrozenList:
+        return value
+    if isinstance(value, dict):
+        return FrozenDict(value)
+    if isinstance(value, list):
+        return FrozenList(value)
+    return value
+
+
+def thaw(d):
+    """Replace the read-only views among the values of d with the mutable
+    containers they hold, returning d"""
+    for key, value in dict.items(d):
+        if isinstance(value, FrozenDict):
+            d[key] = dict.copy(value)
+        elif isinstance(value, FrozenList):
+            d[key] = list.copy(value)
+    return d
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("'%s' object is read-only" % self.__class__.__name__)
+
+
+class FrozenDict(dict):
+    """Read-only dict whose nested containers are frozen on access
+
+    It holds a shallow copy of the dict it wraps, so that json, jsonschema
+    and anything else expecting a dict accept it. Nested containers are
+    only wrapped, in turn, as they are reached.
+    """
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __getitem__(self, key):
+        return freeze(dict.__getitem__(self, key))
+
+    def get(self, key, default=None):
+        if dict.__contains__(self, key):
+            return self[key]
+        return default
+
+    def __iter__(self):
+        # Overridden so that dict(view) and {**view} copy through
+        # __getitem__, rather than reading the unfrozen values directly
+        return dict.__iter__(self)
+
+    def items(self):
+        return ItemsView(self)
+
+    def values(self):
+        return ValuesView(self)
+
+    def __or__(self, other):
+        return dict(self) | other
+
+    def copy(self):
+        """Return a mutable deep copy"""
+        return copy.deepcopy(dict.copy(self))
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict.copy(self), memo)
+
+    def __reduce__(self):
+        return (dict, (self.copy(),))
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, dict.__repr__(self))
+
+
+class FrozenList(list):
+    """Read-only list whose nested containers are frozen on access
+
+    It holds a shallow copy of the list it wraps, so that json, jsonschema
+    and anything else expecting a list accept it. Nested containers are
+    only wrapped, in turn, as they are reached.
+    """
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = clear = _read_only
+    sort = reverse = _read_only
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return FrozenList(list.__getitem__(self, index))
+        return freeze(list.__getitem__(self, index))
+
+    def __iter__(self):
+        for value in list.__iter__(self):
+            yield freeze(value)
+
+    def __reversed__(self):
+        for value in list.__reversed__(self):
+            yield freeze(value)
+
+    def __add__(self, other):
+        return list(self) + other
+
+    def __mul__(self, n):
+        return list(self) * n
+
+    __rmul__ = __mul__
+
+    def copy(self):
+        """Return a mutable deep copy"""
+        return copy.deepcopy(list.copy(self))
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(list.copy(self), memo)
+
+    def __reduce__(self):
+        return (list, (self.copy(),))
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, list.__repr__(self))
+
+
+class ItemsView(collections.abc.ItemsView):
+    """Live items of a dict, with containers wrapped in read-only views"""
+
+    __slots__ = ()
+
+    def __iter__(self):
+        for key, value in dict.items(self._mapping):
+            yield key, freeze(value)
+
+
+class ValuesView(collections.abc.ValuesView):
+    """Live values of a dict, with containers wrapped in read-only views"""
+
+    __slots__ = ()
+
+    def __iter__(self):
+        for value in dict.values(self._mapping):
+            yield freeze(value)